@@ -2,12 +2,14 @@ from flask import Flask
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from jinja2 import FileSystemBytecodeCache
 from pathlib import Path
 import os
+from .database import RoutingSession, engine_options
 
 # Global extensions
 login_manager = LoginManager()
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 
 
@@ -29,7 +31,77 @@ def create_app():
 		SQLALCHEMY_TRACK_MODIFICATIONS=False,
 		MAX_CONTENT_LENGTH=10 * 1024 * 1024,  # 10 MB uploads
 		UPLOAD_FOLDER=str(Path(app.instance_path) / "uploads"),
+		IMPORT_FOLDER=str(Path(app.instance_path) / "imports"),  # admin student uploads waiting for the job worker
+		IMPORT_HASH_WORKERS=int(os.environ.get("IMPORT_HASH_WORKERS", 0)) or None,  # defaults to CPU count
+		# Password hashing: cost factor (existing hashes are upgraded on login) and the login pool
+		BCRYPT_ROUNDS=int(os.environ.get("BCRYPT_ROUNDS", 12)),
+		# Per worker process: hashing threads (default: its share of the CPUs) plus logins allowed to wait for
+		# one. Keep the sum below GUNICORN_THREADS so logins can't take every request thread.
+		BCRYPT_POOL_SIZE=int(os.environ.get("BCRYPT_POOL_SIZE", 0)) or max(1, (os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", 1))),
+		BCRYPT_QUEUE_DEPTH=int(os.environ.get("BCRYPT_QUEUE_DEPTH", 2)),
+		BCRYPT_QUEUE_WAIT=float(os.environ.get("BCRYPT_QUEUE_WAIT", 0.5)),
+		BCRYPT_TIMEOUT=float(os.environ.get("BCRYPT_TIMEOUT", 10)),
+		# Failed-login limits per email and per IP over the window; counted in the login_failures table, shared by all workers
+		LOGIN_THROTTLE_WINDOW=int(os.environ.get("LOGIN_THROTTLE_WINDOW", 900)),
+		LOGIN_MAX_FAILURES_PER_EMAIL=int(os.environ.get("LOGIN_MAX_FAILURES_PER_EMAIL", 5)),
+		LOGIN_MAX_FAILURES_PER_IP=int(os.environ.get("LOGIN_MAX_FAILURES_PER_IP", 50)),
+		# Per-worker cache of logged-in users' identity columns. A change is evicted only in the worker that
+		# made it, so other workers may act on the old row (a role change included) for up to the TTL.
+		USER_CACHE_SIZE=int(os.environ.get("USER_CACHE_SIZE", 10000)),
+		USER_CACHE_TTL=float(os.environ.get("USER_CACHE_TTL", 30)),
+		# Signed bearer tokens issued by /api/login (seconds)
+		API_ACCESS_TOKEN_TTL=int(os.environ.get("API_ACCESS_TOKEN_TTL", 900)),
+		API_REFRESH_TOKEN_TTL=int(os.environ.get("API_REFRESH_TOKEN_TTL", 14 * 24 * 3600)),
+		# Document serving: "" streams from Python, "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd)
+		# hand the transfer to the proxy; UPLOAD_ACCEL_PREFIX is nginx's internal location for UPLOAD_FOLDER
+		UPLOAD_SENDFILE=os.environ.get("UPLOAD_SENDFILE", ""),
+		UPLOAD_ACCEL_PREFIX=os.environ.get("UPLOAD_ACCEL_PREFIX", "/protected-uploads"),
+		UPLOAD_BLOB_MAX_AGE=int(os.environ.get("UPLOAD_BLOB_MAX_AGE", 7 * 24 * 3600)),
+		# Review-page thumbnails (longest side, px), rendered by worker.py
+		PREVIEW_SIZE=int(os.environ.get("PREVIEW_SIZE", 320)),
+		# Job queue (worker.py): seconds before a silent running job is retried, base retry backoff, idle poll
+		JOB_LEASE_SECONDS=int(os.environ.get("JOB_LEASE_SECONDS", 600)),
+		JOB_RETRY_BASE_SECONDS=float(os.environ.get("JOB_RETRY_BASE_SECONDS", 2)),
+		JOB_POLL_SECONDS=float(os.environ.get("JOB_POLL_SECONDS", 1)),
+		# Per-worker cache of serialized /api/scholarships pages, keyed by the catalogue version
+		API_RESPONSE_CACHE_SIZE=int(os.environ.get("API_RESPONSE_CACHE_SIZE", 512)),
+		API_RESPONSE_CACHE_TTL=float(os.environ.get("API_RESPONSE_CACHE_TTL", 600)),
+		# Rendered template fragments: "memory" (per worker) or "file" (shared by the workers on a host)
+		FRAGMENT_CACHE=os.environ.get("FRAGMENT_CACHE", "memory"),
+		FRAGMENT_CACHE_SIZE=int(os.environ.get("FRAGMENT_CACHE_SIZE", 256)),
+		FRAGMENT_CACHE_TTL=float(os.environ.get("FRAGMENT_CACHE_TTL", 300)),
+		FRAGMENT_CACHE_DIR=os.environ.get("FRAGMENT_CACHE_DIR", str(Path(app.instance_path) / "fragment_cache")),
+		# Connection tuning: "default", "high-concurrency" or "minimal" (see app/database.py)
+		DB_ENGINE_PROFILE=os.environ.get("DB_ENGINE_PROFILE", "default"),
+		# Optional read replica for @read_only views; a client that just wrote reads from the primary for a while
+		REPLICA_DATABASE_URL=os.environ.get("REPLICA_DATABASE_URL", ""),
+		REPLICA_STICKY_SECONDS=float(os.environ.get("REPLICA_STICKY_SECONDS", 5)),
+		# How long a submission's Idempotency-Key (or apply-form key) replays its first response
+		IDEMPOTENCY_TTL=int(os.environ.get("IDEMPOTENCY_TTL", 24 * 3600)),
+		# Per-request SQL/template timing: Server-Timing headers, slow-request log and /admin/metrics
+		INSTRUMENTATION=os.environ.get("INSTRUMENTATION", "") == "1",
+		SLOW_REQUEST_MS=float(os.environ.get("SLOW_REQUEST_MS", 500)),
+		INSTRUMENTATION_TOP_QUERIES=int(os.environ.get("INSTRUMENTATION_TOP_QUERIES", 3)),
+		# Sampling profiler: a fraction of all requests and/or named endpoints (admins can also send X-Profile: 1);
+		# collapsed stacks go to PROFILE_DIR, newest PROFILE_KEEP files kept
+		PROFILE_SAMPLE_RATE=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+		PROFILE_ROUTES=os.environ.get("PROFILE_ROUTES", ""),
+		PROFILE_INTERVAL_MS=float(os.environ.get("PROFILE_INTERVAL_MS", 5)),
+		PROFILE_DIR=os.environ.get("PROFILE_DIR", str(Path(app.instance_path) / "profiles")),
+		PROFILE_KEEP=int(os.environ.get("PROFILE_KEEP", 500)),
+		# Startup: compiled templates persist here across restarts ("" disables); WARM_STARTUP makes run.py
+		# configure mappers and compile every template before the first request
+		JINJA_BYTECODE_CACHE_DIR=os.environ.get("JINJA_BYTECODE_CACHE_DIR", str(Path(app.instance_path) / "jinja_cache")),
+		WARM_STARTUP=os.environ.get("WARM_STARTUP", "1") == "1",
 	)
+	app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"], app.config["DB_ENGINE_PROFILE"])
+	if app.config["REPLICA_DATABASE_URL"]:
+		app.config["SQLALCHEMY_BINDS"] = {
+			"replica": {
+				"url": app.config["REPLICA_DATABASE_URL"],
+				**engine_options(app.config["REPLICA_DATABASE_URL"], app.config["DB_ENGINE_PROFILE"]),
+			},
+		}
 
 	# Ensure instance folders exist
 	Path(app.instance_path).mkdir(parents=True, exist_ok=True)
@@ -40,6 +112,25 @@ def create_app():
 	login_manager.login_view = "auth.login"
 	db.init_app(app)
 	migrate.init_app(app, db)
+	from . import database
+	database.init_app(app, db)
+	from . import instrumentation
+	instrumentation.init_app(app, db)
+	from . import profiler
+	profiler.init_app(app)
+
+	from .models import user_cache
+	from . import tokens  # noqa: F401  registers the bearer-token request loader
+	user_cache.configure(app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_TTL"])
+	from .versions import response_cache
+	response_cache.configure(app.config["API_RESPONSE_CACHE_SIZE"], app.config["API_RESPONSE_CACHE_TTL"])
+	from . import fragments
+	fragments.configure(
+		app.config["FRAGMENT_CACHE"],
+		app.config["FRAGMENT_CACHE_SIZE"],
+		app.config["FRAGMENT_CACHE_TTL"],
+		app.config["FRAGMENT_CACHE_DIR"],
+	)
 
 	# Register blueprints
 	from .auth import auth_bp
@@ -52,17 +143,47 @@ def create_app():
 	app.register_blueprint(student_bp, url_prefix="/student")
 	app.register_blueprint(api_bp, url_prefix="/api")
 
-	# Static serving for uploaded files
-	from flask import send_from_directory
+	# CLI commands
+	from .stats import stats_cli
+	from .ledger import ledger_cli
+	from .importer import import_cli
+	from .storage import uploads_cli
+	from .jobs import jobs_cli
+	from .search import search_cli
+	from .submissions import submissions_cli
+	from .synthetic import synthetic_cli
+	from .reports import reports_cli
+	from . import previews  # noqa: F401  registers its job handler
+	app.cli.add_command(stats_cli)
+	app.cli.add_command(ledger_cli)
+	app.cli.add_command(import_cli)
+	app.cli.add_command(uploads_cli)
+	app.cli.add_command(jobs_cli)
+	app.cli.add_command(search_cli)
+	app.cli.add_command(submissions_cli)
+	app.cli.add_command(synthetic_cli)
+	app.cli.add_command(reports_cli)
+
+	# Uploaded files: conditional/Range responses, optionally handed off to the front proxy
+	from .storage import send_upload
 
 	@app.get("/uploads/<path:path>")
 	def uploads_file(path: str):
-		return send_from_directory(app.config["UPLOAD_FOLDER"], path, as_attachment=False)
+		return send_upload(path)
 
 	# Jinja filters
 	from .utils import upload_url as _upload_url, is_pdf as _is_pdf
+	from .previews import preview_url as _preview_url, queue_missing as _queue_missing_previews
 	app.jinja_env.filters["upload_url"] = _upload_url
 	app.jinja_env.filters["is_pdf"] = _is_pdf
+	app.jinja_env.filters["preview_url"] = _preview_url
+	app.after_request(_queue_missing_previews)
+	app.jinja_env.globals["fragment_slot"] = fragments.slot
+	from .submissions import new_key as _new_idempotency_key
+	app.jinja_env.globals["new_idempotency_key"] = _new_idempotency_key
+	if app.config["JINJA_BYTECODE_CACHE_DIR"]:
+		Path(app.config["JINJA_BYTECODE_CACHE_DIR"]).mkdir(parents=True, exist_ok=True)
+		app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config["JINJA_BYTECODE_CACHE_DIR"])
 
 	# Index route
 	@app.get("/")
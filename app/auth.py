@@ -1,8 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required
-from . import db
+from . import db, stats
 from .models import User
-from .utils import hash_password, check_password
+from .utils import hash_password
+from .security import authenticate, LoginRejected
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -16,8 +17,15 @@ def login():
 def login_post():
 	email = request.form.get("email", "").strip().lower()
 	password = request.form.get("password", "")
-	user = db.session.query(User).filter_by(email=email).first()
-	if not user or not check_password(password, user.password_hash):
+	try:
+		user = authenticate(email, password, request.remote_addr)
+	except LoginRejected as exc:
+		if exc.reason == "throttled":
+			flash(f"Too many failed attempts. Try again in {exc.retry_after} seconds.", "danger")
+		else:
+			flash("The server is busy. Please try again in a moment.", "warning")
+		return redirect(url_for("auth.login"))
+	if not user:
 		flash("Invalid credentials", "danger")
 		return redirect(url_for("auth.login"))
 	login_user(user)
@@ -47,6 +55,7 @@ def register_post():
 		department=department,
 	)
 	db.session.add(user)
+	stats.student_registered(user)
 	db.session.commit()
 	flash("Registration successful. You can login now.", "success")
 	return redirect(url_for("auth.login"))
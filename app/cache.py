@@ -0,0 +1,138 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+	# Thread-safe LRU with a per-entry time limit, shared by every request in a worker process
+	def __init__(self, maxsize: int = 1024, ttl: float = 300):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._data: OrderedDict = OrderedDict()
+		self._lock = threading.Lock()
+
+	def configure(self, maxsize: int, ttl: float) -> None:
+		with self._lock:
+			self.maxsize = maxsize
+			self.ttl = ttl
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def get(self, key, default: Any = None) -> Any:
+		with self._lock:
+			entry = self._data.get(key, _MISSING)
+			if entry is _MISSING:
+				return default
+			expires, value = entry
+			if expires < time.monotonic():
+				del self._data[key]
+				return default
+			self._data.move_to_end(key)
+			return value
+
+	def set(self, key, value, ttl: Optional[float] = None) -> None:
+		if self.maxsize <= 0:
+			return
+		with self._lock:
+			self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def pop(self, key) -> None:
+		with self._lock:
+			self._data.pop(key, None)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+
+	def __len__(self) -> int:
+		return len(self._data)
+
+
+class FileCache:
+	# Same interface as TTLCache for string values, but entries are files, so every gunicorn worker on the host shares them.
+	# A file's mtime is set to its expiry time when written and never touched on read, so an entry dies on
+	# schedule however often it's hit; past maxsize, the entries closest to expiring go first.
+	def __init__(self, path: str, maxsize: int = 1024, ttl: float = 300):
+		self.path = path
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._writes = 0
+		os.makedirs(path, exist_ok=True)
+
+	def configure(self, maxsize: int, ttl: float) -> None:
+		self.maxsize = maxsize
+		self.ttl = ttl
+
+	def _file(self, key: str) -> str:
+		return os.path.join(self.path, hashlib.sha1(str(key).encode("utf-8")).hexdigest())
+
+	def get(self, key, default: Any = None) -> Any:
+		path = self._file(key)
+		try:
+			with open(path, "rb") as fh:
+				if os.fstat(fh.fileno()).st_mtime < time.time():
+					return default
+				return fh.read().decode("utf-8")
+		except (OSError, UnicodeDecodeError):
+			return default
+
+	def set(self, key, value: str, ttl: Optional[float] = None) -> None:
+		if self.maxsize <= 0:
+			return
+		expires = time.time() + (self.ttl if ttl is None else ttl)
+		fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".tmp")
+		with os.fdopen(fd, "wb") as fh:
+			fh.write(value.encode("utf-8"))
+		os.utime(tmp, (expires, expires))
+		os.replace(tmp, self._file(key))
+		self._writes += 1
+		if self._writes % 32 == 0:
+			self.prune()
+
+	def pop(self, key) -> None:
+		try:
+			os.remove(self._file(key))
+		except FileNotFoundError:
+			pass
+
+	def prune(self) -> None:
+		entries = []
+		now = time.time()
+		for entry in os.scandir(self.path):
+			try:
+				mtime = entry.stat().st_mtime
+				if entry.name.startswith(".tmp"):
+					# Mid-write (mtime is the write time until it's renamed); only leftovers of a crash go
+					if mtime < now - self.ttl:
+						os.remove(entry.path)
+					continue
+				entries.append((mtime, entry.path))
+			except FileNotFoundError:
+				continue
+		entries.sort()
+		excess = len(entries) - self.maxsize
+		for i, (expires, path) in enumerate(entries):
+			if i < excess or expires < now:
+				try:
+					os.remove(path)
+				except FileNotFoundError:
+					pass
+
+	def clear(self) -> None:
+		for entry in os.scandir(self.path):
+			try:
+				os.remove(entry.path)
+			except FileNotFoundError:
+				pass
+
+	def __len__(self) -> int:
+		return sum(1 for e in os.scandir(self.path) if not e.name.startswith(".tmp"))
@@ -0,0 +1,106 @@
+import functools
+import time
+import sqlalchemy as sa
+from flask import Flask, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA = "replica"
+
+# Connection-level settings per profile. SQLite pragmas run on every new connection; pool settings
+# apply to server databases (MySQL/Postgres), where SQLAlchemy's QueuePool is used.
+ENGINE_PROFILES = {
+	# Library defaults: rollback journal, no busy timeout, default pool
+	"minimal": {},
+	"default": {
+		"sqlite_pragmas": {
+			"journal_mode": "WAL",  # readers no longer block the writer (persisted in the file)
+			"synchronous": "NORMAL",  # durable at checkpoints; safe with WAL
+			"busy_timeout": 5000,  # ms to wait on a locked database instead of failing at once
+			"cache_size": -16000,  # KiB of page cache per connection
+			"temp_store": "MEMORY",
+		},
+		"pool": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 10, "pool_recycle": 280, "pool_pre_ping": True},
+	},
+	"high-concurrency": {
+		"sqlite_pragmas": {
+			"journal_mode": "WAL",
+			"synchronous": "NORMAL",
+			"busy_timeout": 15000,
+			"cache_size": -64000,
+			"temp_store": "MEMORY",
+			"mmap_size": 256 * 1024 * 1024,
+		},
+		"pool": {"pool_size": 20, "max_overflow": 40, "pool_timeout": 5, "pool_recycle": 280, "pool_pre_ping": True},
+	},
+}
+
+
+def engine_options(uri: str, profile_name: str) -> dict:
+	# SQLALCHEMY_ENGINE_OPTIONS for the chosen profile; only pool settings live here
+	if profile_name not in ENGINE_PROFILES:
+		raise ValueError(f"Unknown DB_ENGINE_PROFILE: {profile_name}")
+	if uri.startswith("sqlite"):
+		return {}
+	return dict(ENGINE_PROFILES[profile_name].get("pool", {}))
+
+
+def _install_pragmas(engine: sa.engine.Engine, pragmas: dict) -> None:
+	@event.listens_for(engine, "connect")
+	def set_pragmas(dbapi_connection, _record):
+		cursor = dbapi_connection.cursor()
+		for name, value in pragmas.items():
+			cursor.execute(f"PRAGMA {name} = {value}")
+		cursor.close()
+
+
+class RoutingSession(Session):
+	# Sends reads to the replica while the request is marked read-only; writes, flushes and anything
+	# after the first write in the session go to the primary
+	def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+		if bind is None and _replica_allowed():
+			engines = self._db.engines
+			if REPLICA in engines and not self.info.get("wrote"):
+				if self._flushing or isinstance(clause, sa.UpdateBase):
+					self.info["wrote"] = True
+				else:
+					return engines[REPLICA]
+		if self._flushing or isinstance(clause, sa.UpdateBase):
+			_note_write()
+		return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_allowed() -> bool:
+	if not has_request_context() or not g.get("db_read_only"):
+		return False
+	# Just after this client wrote something, read it back from the primary rather than a lagging replica
+	return session.get("db_primary_until", 0) < time.time()
+
+
+def _note_write() -> None:
+	if has_request_context():
+		g.db_wrote = True
+
+
+def read_only(view):
+	# Marks a view whose reads may be served by the replica (when one is configured)
+	@functools.wraps(view)
+	def wrapper(*args, **kwargs):
+		g.db_read_only = True
+		return view(*args, **kwargs)
+	return wrapper
+
+
+def init_app(app: Flask, db) -> None:
+	profile = ENGINE_PROFILES[app.config["DB_ENGINE_PROFILE"]]
+	with app.app_context():
+		for engine in db.engines.values():
+			if engine.dialect.name == "sqlite" and profile.get("sqlite_pragmas"):
+				_install_pragmas(engine, profile["sqlite_pragmas"])
+
+	if app.config.get("SQLALCHEMY_BINDS", {}).get(REPLICA):
+		@app.after_request
+		def stick_to_primary(response):
+			if g.get("db_wrote"):
+				session["db_primary_until"] = time.time() + app.config["REPLICA_STICKY_SECONDS"]
+			return response
@@ -0,0 +1,122 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Optional
+from sqlalchemy import update
+from . import db, stats, ledger, reports
+from .models import Application, Scholarship
+from .sqlutil import chunked
+
+DECISION_STATUSES = {"approved", "rejected"}
+MAX_BATCH = 10000
+
+
+def apply_decision(app: Application, status: str, remarks: Optional[str], reviewer_id: int) -> bool:
+	# Compare-and-set on the status this request read: of two reviewers deciding the same application at
+	# once, only the one whose UPDATE matched posts ledger, stats and rollup deltas. False means it lost.
+	old_status = app.status
+	res = db.session.execute(
+		update(Application)
+		.where(Application.application_id == app.application_id, Application.status == old_status)
+		.values(status=status, remarks=remarks, reviewed_by=reviewer_id)
+	)
+	if res.rowcount != 1:
+		db.session.expire(app)
+		return False
+	stats.application_decided(old_status, status, app.scholarship.amount)
+	reports.application_decided(app, old_status, status)
+	# Post the allocation (or its reversal) to the ledger; yearly totals move in SQL
+	ledger.record_decision(app, status, reviewer_id)
+	return True
+
+
+def decide_many(decisions: list[dict], reviewer_id: int) -> list[dict]:
+	# Validates every item, then applies the valid ones with one UPDATE per (old status, status, remarks) group,
+	# one ledger insert, one stats bump and one rollup upsert. The caller owns the commit.
+	results: list[dict] = []
+	wanted: dict[int, dict] = {}
+	for item in decisions:
+		try:
+			app_id = int(item.get("application_id"))
+		except (TypeError, ValueError, AttributeError):
+			results.append({"application_id": item.get("application_id") if isinstance(item, dict) else None, "ok": False, "error": "invalid_id"})
+			continue
+		result = {"application_id": app_id, "ok": False}
+		results.append(result)
+		if item.get("status") not in DECISION_STATUSES:
+			result["error"] = "invalid_status"
+		elif app_id in wanted:
+			result["error"] = "duplicate"
+		else:
+			wanted[app_id] = {"status": item["status"], "remarks": item.get("remarks"), "result": result}
+
+	# Rows are locked where the database supports it (no-op on SQLite), and every UPDATE below is also
+	# conditioned on the status read here, so a concurrent decision can't make us post deltas twice
+	current: dict[int, tuple] = {}
+	for ids in chunked(wanted):
+		rows = (
+			reports.with_department(
+				db.session.query(
+					Application.application_id, Application.status, Scholarship.amount,
+					Application.submitted_date, Scholarship.category, reports.department,
+				)
+				.join(Scholarship, Scholarship.scholarship_id == Application.scholarship_id)
+			)
+			.filter(Application.application_id.in_(ids))
+			.with_for_update(of=Application)
+			.all()
+		)
+		current.update({row[0]: tuple(row[1:]) for row in rows})
+
+	groups: dict[tuple, list[int]] = defaultdict(list)
+	for app_id, want in wanted.items():
+		if app_id not in current:
+			want["result"]["error"] = "not_found"
+			continue
+		groups[(current[app_id][0], want["status"], want["remarks"])].append(app_id)
+
+	returning = db.session.get_bind().dialect.update_returning
+	changed: set[int] = set()
+	for (old_status, status, remarks), ids in groups.items():
+		for chunk in chunked(ids):
+			stmt = (
+				update(Application)
+				.where(Application.application_id.in_(chunk), Application.status == old_status)
+				.values(status=status, remarks=remarks, reviewed_by=reviewer_id)
+				.execution_options(synchronize_session=False)
+			)
+			if returning:
+				changed.update(db.session.execute(stmt.returning(Application.application_id)).scalars())
+			elif db.session.execute(stmt).rowcount == len(chunk):
+				changed.update(chunk)
+			# Without RETURNING (MySQL) the locked read makes a partial match impossible
+
+	deltas: Counter = Counter()
+	rollup_deltas: dict[tuple, Counter] = defaultdict(Counter)
+	entries: list[dict] = []
+	year = date.today().year
+	now = datetime.utcnow()
+	nets = {}
+	for ids in chunked(sorted(changed)):
+		nets.update(ledger.net_allocations(ids))
+	for app_id, want in wanted.items():
+		if app_id not in current:
+			continue
+		if app_id not in changed:
+			want["result"]["error"] = "conflict"
+			continue
+		old_status, amount, submitted, category, department = current[app_id]
+		if old_status != want["status"]:
+			deltas[stats.status_key(old_status)] -= 1
+			deltas[stats.status_key(want["status"])] += 1
+			if want["status"] == "approved":
+				deltas[stats.ALLOCATED] += float(amount)
+			elif old_status == "approved":
+				deltas[stats.ALLOCATED] -= float(amount)
+		reports.add_decision(rollup_deltas, submitted, category, department, old_status, want["status"], amount, now)
+		entries.extend(ledger.plan_entries(app_id, want["status"], amount, nets.get(app_id, {}), year))
+		want["result"]["ok"] = True
+
+	ledger.post(entries, reviewer_id)
+	stats.bump(deltas)
+	reports.bump(rollup_deltas)
+	return results
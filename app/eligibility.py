@@ -0,0 +1,116 @@
+from datetime import date
+from typing import Iterable, Optional
+import numpy as np
+from sqlalchemy import select
+from . import db
+from .models import User, Scholarship, Application
+
+STUDENT_CHUNK = 20000
+
+
+def _floats(values: Iterable[Optional[float]]) -> np.ndarray:
+	return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+
+class ScholarshipMatrix:
+	# Column view of a set of scholarships; NaN means "no threshold"
+	def __init__(self, ids, min_cgpa, income_limit):
+		self.ids = np.asarray(ids, dtype=np.int64)
+		self.min_cgpa = np.asarray(min_cgpa, dtype=np.float64)
+		self.income_limit = np.asarray(income_limit, dtype=np.float64)
+
+	@classmethod
+	def from_items(cls, items: list[Scholarship]) -> "ScholarshipMatrix":
+		return cls(
+			[s.scholarship_id for s in items],
+			_floats(s.min_cgpa for s in items),
+			_floats(s.income_limit for s in items),
+		)
+
+	@classmethod
+	def active(cls, on: Optional[date] = None) -> "ScholarshipMatrix":
+		on = on or date.today()
+		rows = db.session.execute(
+			select(Scholarship.scholarship_id, Scholarship.min_cgpa, Scholarship.income_limit)
+			.where(Scholarship.start_date <= on, Scholarship.end_date >= on)
+			.order_by(Scholarship.scholarship_id)
+		).all()
+		return cls([r[0] for r in rows], _floats(r[1] for r in rows), _floats(r[2] for r in rows))
+
+	def __len__(self) -> int:
+		return len(self.ids)
+
+
+def eligible_mask(cgpa: np.ndarray, income: np.ndarray, sch: ScholarshipMatrix) -> np.ndarray:
+	# students x scholarships. Same rules as student.apply(): a missing CGPA counts as 0,
+	# and income only blocks when both the limit and the student's income are known.
+	cgpa = np.nan_to_num(cgpa, nan=0.0)[:, None]
+	income = income[:, None]
+	cgpa_ok = np.isnan(sch.min_cgpa)[None, :] | (cgpa >= sch.min_cgpa[None, :])
+	with np.errstate(invalid="ignore"):
+		income_ok = np.isnan(sch.income_limit)[None, :] | np.isnan(income) | (income <= sch.income_limit[None, :])
+	return cgpa_ok & income_ok
+
+
+def eligible_ids(student: User, items: list[Scholarship]) -> set[int]:
+	sch = ScholarshipMatrix.from_items(items)
+	if not len(sch):
+		return set()
+	mask = eligible_mask(_floats([student.cgpa]), _floats([student.family_income]), sch)[0]
+	return set(sch.ids[mask].tolist())
+
+
+def _student_arrays():
+	rows = db.session.execute(
+		select(User.user_id, User.cgpa, User.family_income)
+		.where(User.role == "student")
+		.order_by(User.user_id)
+	).all()
+	ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+	return ids, _floats(r[1] for r in rows), _floats(r[2] for r in rows)
+
+
+def _applied_pairs(sch: ScholarshipMatrix):
+	rows = db.session.execute(
+		select(Application.student_id, Application.scholarship_id)
+		.where(Application.scholarship_id.in_(sch.ids.tolist()))
+	).all()
+	students = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+	scholarships = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+	return students, scholarships
+
+
+def missing_applicants_report(on: Optional[date] = None) -> dict[int, dict]:
+	# Per active scholarship: how many students are eligible, and how many of those haven't applied
+	sch = ScholarshipMatrix.active(on)
+	out = {int(i): {"eligible": 0, "not_applied": 0} for i in sch.ids}
+	if not len(sch):
+		return out
+	student_ids, cgpa, income = _student_arrays()
+	pair_students, pair_sch = _applied_pairs(sch)
+	pair_cols = np.searchsorted(sch.ids, pair_sch)
+	eligible_total = np.zeros(len(sch), dtype=np.int64)
+	missing_total = np.zeros(len(sch), dtype=np.int64)
+	for start in range(0, len(student_ids), STUDENT_CHUNK):
+		chunk_ids = student_ids[start:start + STUDENT_CHUNK]
+		eligible = eligible_mask(cgpa[start:start + STUDENT_CHUNK], income[start:start + STUDENT_CHUNK], sch)
+		applied = np.zeros_like(eligible)
+		rows = np.searchsorted(chunk_ids, pair_students)
+		in_chunk = (rows < len(chunk_ids)) & (chunk_ids[np.minimum(rows, len(chunk_ids) - 1)] == pair_students)
+		applied[rows[in_chunk], pair_cols[in_chunk]] = True
+		eligible_total += eligible.sum(axis=0)
+		missing_total += (eligible & ~applied).sum(axis=0)
+	for col, sch_id in enumerate(sch.ids):
+		out[int(sch_id)] = {"eligible": int(eligible_total[col]), "not_applied": int(missing_total[col])}
+	return out
+
+
+def eligible_not_applied(scholarship: Scholarship, limit: int = 200) -> list[int]:
+	sch = ScholarshipMatrix.from_items([scholarship])
+	student_ids, cgpa, income = _student_arrays()
+	mask = eligible_mask(cgpa, income, sch)[:, 0]
+	applied = db.session.execute(
+		select(Application.student_id).where(Application.scholarship_id == scholarship.scholarship_id)
+	).scalars().all()
+	mask &= ~np.isin(student_ids, np.fromiter(applied, dtype=np.int64, count=len(applied)))
+	return student_ids[mask][:limit].tolist()
@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterator, Optional
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from . import db
+from .models import User, Scholarship, Application, Finance
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+YIELD_PER = 1000
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _applications_stmt(status: Optional[str] = None):
+	reviewer = aliased(User)
+	stmt = (
+		select(
+			Application.application_id,
+			Application.status,
+			Application.submitted_date,
+			Application.cgpa_value,
+			Application.remarks,
+			User.user_id.label("student_id"),
+			User.name.label("student_name"),
+			User.email.label("student_email"),
+			User.department,
+			Scholarship.scholarship_id,
+			Scholarship.name.label("scholarship_name"),
+			Scholarship.category,
+			Scholarship.amount,
+			reviewer.name.label("reviewed_by"),
+		)
+		.join(User, User.user_id == Application.student_id)
+		.join(Scholarship, Scholarship.scholarship_id == Application.scholarship_id)
+		.outerjoin(reviewer, reviewer.user_id == Application.reviewed_by)
+		.order_by(Application.application_id)
+	)
+	if status in {"pending", "approved", "rejected"}:
+		stmt = stmt.where(Application.status == status)
+	return stmt
+
+
+def _students_stmt(status: Optional[str] = None):
+	return (
+		select(User.user_id, User.name, User.email, User.department, User.cgpa, User.family_income)
+		.where(User.role == "student")
+		.order_by(User.user_id)
+	)
+
+
+def _finance_stmt(status: Optional[str] = None):
+	return (
+		select(Finance.year, Finance.budget_amount, Finance.allocated_amount, Finance.balance_amount)
+		.order_by(Finance.year)
+	)
+
+
+EXPORTS = {
+	"applications": _applications_stmt,
+	"students": _students_stmt,
+	"finance": _finance_stmt,
+}
+
+
+def _plain(value, spreadsheet: bool = False):
+	if isinstance(value, (date, datetime)):
+		return value.isoformat()
+	if spreadsheet and isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+		# Names and remarks are user-typed; a leading quote keeps spreadsheets from running them as formulas
+		return "'" + value
+	return value
+
+
+def _rows(stmt):
+	# Server-side cursor where the driver has one; rows are fetched YIELD_PER at a time either way
+	result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=YIELD_PER))
+	return result.keys(), result
+
+
+def _csv_chunks(stmt) -> Iterator[str]:
+	keys, result = _rows(stmt)
+	buf = io.StringIO()
+	writer = csv.writer(buf)
+	writer.writerow(list(keys))
+	for partition in result.partitions():
+		writer.writerows([_plain(v, spreadsheet=True) for v in row] for row in partition)
+		yield buf.getvalue()
+		buf.seek(0)
+		buf.truncate()
+	yield buf.getvalue()
+
+
+def _ndjson_chunks(stmt) -> Iterator[str]:
+	keys, result = _rows(stmt)
+	keys = list(keys)
+	for partition in result.partitions():
+		yield "".join(json.dumps(dict(zip(keys, (_plain(v) for v in row)))) + "\n" for row in partition)
+
+
+def export_response(kind: str, fmt: str, status: Optional[str] = None) -> Response:
+	stmt = EXPORTS[kind](status)
+	chunks = _csv_chunks(stmt) if fmt == "csv" else _ndjson_chunks(stmt)
+	stamp = date.today().isoformat()
+	return Response(
+		stream_with_context(chunks),
+		mimetype=EXPORT_FORMATS[fmt],
+		headers={
+			"Content-Disposition": f'attachment; filename="{kind}-{stamp}.{fmt}"',
+			"X-Accel-Buffering": "no",
+		},
+	)
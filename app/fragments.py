@@ -0,0 +1,41 @@
+import re
+from typing import Callable, Union
+from markupsafe import Markup
+from .cache import FileCache, TTLCache
+
+# Placeholder left in shared fragments where per-user markup goes; escaped text can never produce one
+SLOT_RE = re.compile(r"<!--slot:(\d+)-->")
+
+_backend: Union[TTLCache, FileCache] = TTLCache(maxsize=256, ttl=300)
+
+
+def configure(kind: str, maxsize: int, ttl: float, path: str) -> None:
+	global _backend
+	if kind == "file":
+		_backend = FileCache(path, maxsize, ttl)
+	elif kind == "memory":
+		_backend = TTLCache(maxsize, ttl)
+	else:
+		raise ValueError(f"Unknown FRAGMENT_CACHE backend: {kind}")
+
+
+def backend() -> Union[TTLCache, FileCache]:
+	return _backend
+
+
+def slot(key: int) -> Markup:
+	return Markup(f"<!--slot:{int(key)}-->")
+
+
+def cached(name: str, key: tuple, render: Callable[[], str]) -> str:
+	# key must include every data version the fragment depends on; old versions are simply never asked for again
+	full_key = f"{name}:{':'.join(str(k) for k in key)}"
+	html = _backend.get(full_key)
+	if html is None:
+		html = str(render())
+		_backend.set(full_key, html)
+	return html
+
+
+def fill_slots(html: str, render_slot: Callable[[int], str]) -> Markup:
+	return Markup(SLOT_RE.sub(lambda m: str(render_slot(int(m.group(1)))), html))
@@ -0,0 +1,210 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import partial
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+from . import db, jobs, stats, versions
+from .models import User, Scholarship
+from .utils import hash_password
+
+CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+STUDENT_COLUMNS = {"name", "email", "password"}
+SCHOLARSHIP_COLUMNS = {"name", "category", "eligibility", "amount", "start_date", "end_date"}
+
+import_cli = AppGroup("import", help="Bulk CSV import.")
+
+
+def _optional_float(value: Optional[str]) -> Optional[float]:
+	value = (value or "").strip()
+	return float(value) if value else None
+
+
+def _student_row(raw: dict) -> dict:
+	name = (raw.get("name") or "").strip()
+	email = (raw.get("email") or "").strip().lower()
+	password = raw.get("password") or ""
+	if not name or not password:
+		raise ValueError("name and password are required")
+	if "@" not in email:
+		raise ValueError("invalid email")
+	cgpa = _optional_float(raw.get("cgpa"))
+	if cgpa is not None and not 0 <= cgpa <= 10:
+		raise ValueError("cgpa must be between 0 and 10")
+	return {
+		"name": name,
+		"email": email,
+		"password": password,
+		"role": "student",
+		"department": (raw.get("department") or "").strip() or None,
+		"cgpa": cgpa,
+		"family_income": _optional_float(raw.get("family_income")),
+	}
+
+
+def _scholarship_row(raw: dict) -> dict:
+	row = {k: (raw.get(k) or "").strip() for k in SCHOLARSHIP_COLUMNS}
+	if not all(row.values()):
+		raise ValueError("name, category, eligibility, amount, start_date and end_date are required")
+	amount = float(row["amount"])
+	if amount <= 0:
+		raise ValueError("amount must be positive")
+	min_cgpa = _optional_float(raw.get("min_cgpa"))
+	return {
+		"name": row["name"],
+		"category": row["category"],
+		"eligibility": row["eligibility"],
+		"amount": amount,
+		"start_date": date.fromisoformat(row["start_date"]),
+		"end_date": date.fromisoformat(row["end_date"]),
+		"min_cgpa": min_cgpa,
+		"income_limit": _optional_float(raw.get("income_limit")),
+	}
+
+
+def _validated(stream: TextIO, required: set, parse, report: dict) -> Iterator[dict]:
+	reader = csv.DictReader(stream)
+	missing = required - set(reader.fieldnames or [])
+	if missing:
+		raise ValueError(f"missing columns: {', '.join(sorted(missing))}")
+	for raw in reader:
+		try:
+			yield parse(raw)
+		except ValueError as exc:
+			report["invalid"] += 1
+			if len(report["errors"]) < MAX_REPORTED_ERRORS:
+				report["errors"].append(f"line {reader.line_num}: {exc}")
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+	chunk = []
+	for row in rows:
+		chunk.append(row)
+		if len(chunk) >= size:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+
+def _new_report() -> dict:
+	return {"created": 0, "skipped": 0, "invalid": 0, "errors": []}
+
+
+def import_students(stream: TextIO, workers: Optional[int] = None) -> dict:
+	report = _new_report()
+	seen: set[str] = set()
+	workers = workers or current_app.config.get("IMPORT_HASH_WORKERS") or os.cpu_count() or 1
+	hasher = partial(hash_password, rounds=current_app.config["BCRYPT_ROUNDS"])
+	# spawn, not fork: the parent holds DB connections and possibly threads
+	with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+		for chunk in _chunks(_validated(stream, STUDENT_COLUMNS, _student_row, report), CHUNK_SIZE):
+			fresh = []
+			for r in chunk:
+				if r["email"] not in seen:
+					seen.add(r["email"])
+					fresh.append(r)
+			existing = set(db.session.execute(
+				select(User.email).where(User.email.in_([r["email"] for r in fresh]))
+			).scalars())
+			rows = [r for r in fresh if r["email"] not in existing]
+			report["skipped"] += len(chunk) - len(rows)
+			if not rows:
+				continue
+			hashes = pool.map(hasher, [r.pop("password") for r in rows], chunksize=64)
+			for row, hashed in zip(rows, hashes):
+				row["password_hash"] = hashed
+			db.session.execute(insert(User), rows)
+			stats.bump({stats.STUDENTS: len(rows)})
+			db.session.commit()
+			report["created"] += len(rows)
+	return report
+
+
+def import_scholarships(stream: TextIO) -> dict:
+	report = _new_report()
+	for rows in _chunks(_validated(stream, SCHOLARSHIP_COLUMNS, _scholarship_row, report), CHUNK_SIZE):
+		db.session.execute(insert(Scholarship), rows)
+		stats.bump(Counter(stats.category_key(r["category"]) for r in rows))
+		versions.bump(versions.SCHOLARSHIPS)
+		db.session.commit()
+		report["created"] += len(rows)
+	return report
+
+
+def queue_student_import(file_storage) -> Path:
+	# The admin upload only stores the file and queues it: hashing thousands of passwords belongs in
+	# the job worker, not in a web request. The caller commits the job with the request.
+	directory = Path(current_app.config["IMPORT_FOLDER"])
+	directory.mkdir(parents=True, exist_ok=True)
+	path = directory / f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.csv"
+	file_storage.save(path)
+	jobs.enqueue("students.import", {"path": str(path)}, priority=150, max_attempts=3)
+	return path
+
+
+@jobs.handler("students.import")
+def import_students_job(payloads: list[dict]) -> None:
+	# Already-imported emails are skipped, so a retry after a partial run carries on where it stopped
+	for payload in payloads:
+		path = Path(payload["path"])
+		with open(path, encoding="utf-8-sig", newline="") as fh:
+			try:
+				report = import_students(fh)
+			except ValueError as exc:  # bad header: retrying won't help
+				report = {**_new_report(), "errors": [str(exc)], "failed": True}
+		path.with_suffix(".json").write_text(json.dumps(report), encoding="utf-8")
+
+
+def recent_imports(limit: int = 10) -> list[dict]:
+	directory = Path(current_app.config["IMPORT_FOLDER"])
+	if not directory.is_dir():
+		return []
+	out = []
+	for path in sorted(directory.glob("*.csv"), reverse=True)[:limit]:
+		result = path.with_suffix(".json")
+		out.append({
+			"name": path.name,
+			"uploaded": datetime.strptime(path.name[:15], "%Y%m%dT%H%M%S"),
+			"report": json.loads(result.read_text(encoding="utf-8")) if result.exists() else None,
+		})
+	return out
+
+
+def text_stream(file_storage) -> TextIO:
+	# Wraps the upload without reading it into memory
+	return io.TextIOWrapper(file_storage.stream, encoding="utf-8-sig", newline="")
+
+
+def _echo_report(report: dict) -> None:
+	click.echo(f"Created {report['created']}, skipped {report['skipped']} existing, {report['invalid']} invalid")
+	for error in report["errors"]:
+		click.echo(f"  {error}")
+
+
+@import_cli.command("students")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", type=int, default=None, help="Password hashing processes.")
+def import_students_command(path: str, workers: Optional[int]):
+	"""Import students from a CSV with name,email,password[,department,cgpa,family_income]."""
+	with open(path, encoding="utf-8-sig", newline="") as fh:
+		_echo_report(import_students(fh, workers))
+
+
+@import_cli.command("scholarships")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_scholarships_command(path: str):
+	"""Import scholarships from a CSV with name,category,eligibility,amount,start_date,end_date[,min_cgpa,income_limit]."""
+	with open(path, encoding="utf-8-sig", newline="") as fh:
+		_echo_report(import_scholarships(fh))
@@ -0,0 +1,191 @@
+import heapq
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+from flask import Flask, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+# Request latency histogram bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_CHARS = 500
+
+log = logging.getLogger("app.slow_requests")
+
+
+class RequestStats:
+	__slots__ = ("started", "queries", "db_seconds", "template_seconds", "template_depth", "template_started", "slowest")
+
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.queries = 0
+		self.db_seconds = 0.0
+		self.template_seconds = 0.0
+		self.template_depth = 0
+		self.template_started = 0.0
+		self.slowest: list[tuple[float, int, str]] = []  # min-heap of the slowest statements
+
+
+class Metrics:
+	# Per-worker aggregates behind /admin/metrics; each process reports its own counters
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self) -> None:
+		with self._lock:
+			self._buckets: dict[tuple[str, str], list[int]] = defaultdict(lambda: [0] * len(BUCKETS))
+			self._duration: dict[tuple[str, str], list[float]] = defaultdict(lambda: [0.0, 0])  # sum, count
+			self._responses: dict[tuple[str, str, str], int] = defaultdict(int)
+			self._queries: dict[str, int] = defaultdict(int)
+			self._db_seconds: dict[str, float] = defaultdict(float)
+			self._template_seconds: dict[str, float] = defaultdict(float)
+			self._slow: dict[str, int] = defaultdict(int)
+
+	def observe(self, route: str, method: str, status: int, seconds: float, stats: RequestStats, slow: bool) -> None:
+		with self._lock:
+			counts = self._buckets[(route, method)]
+			for i, bound in enumerate(BUCKETS):
+				if seconds <= bound:
+					counts[i] += 1
+			total = self._duration[(route, method)]
+			total[0] += seconds
+			total[1] += 1
+			self._responses[(route, method, str(status))] += 1
+			self._queries[route] += stats.queries
+			self._db_seconds[route] += stats.db_seconds
+			self._template_seconds[route] += stats.template_seconds
+			if slow:
+				self._slow[route] += 1
+
+	def render(self) -> str:
+		# Prometheus text exposition format, version 0.0.4
+		lines = []
+		with self._lock:
+			lines += [
+				"# HELP portal_request_duration_seconds Request latency by route.",
+				"# TYPE portal_request_duration_seconds histogram",
+			]
+			for (route, method), counts in sorted(self._buckets.items()):
+				labels = f'route="{_label(route)}",method="{method}"'
+				for bound, count in zip(BUCKETS, counts):
+					lines.append(f'portal_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+				total, count = self._duration[(route, method)]
+				lines.append(f'portal_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+				lines.append(f"portal_request_duration_seconds_sum{{{labels}}} {total:.6f}")
+				lines.append(f"portal_request_duration_seconds_count{{{labels}}} {count}")
+			lines += ["# HELP portal_responses_total Responses by route and status code.", "# TYPE portal_responses_total counter"]
+			for (route, method, status), count in sorted(self._responses.items()):
+				lines.append(f'portal_responses_total{{route="{_label(route)}",method="{method}",status="{status}"}} {count}')
+			for name, help_text, values, fmt in (
+				("portal_db_queries_total", "SQL statements executed.", self._queries, "{}"),
+				("portal_db_seconds_total", "Time spent executing SQL.", self._db_seconds, "{:.6f}"),
+				("portal_template_seconds_total", "Time spent rendering templates.", self._template_seconds, "{:.6f}"),
+				("portal_slow_requests_total", "Requests over SLOW_REQUEST_MS.", self._slow, "{}"),
+			):
+				lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+				for route, value in sorted(values.items()):
+					lines.append(f'{name}{{route="{_label(route)}"}} ' + fmt.format(value))
+		return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _label(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _current() -> Optional[RequestStats]:
+	return g.get("instrumentation") if has_request_context() else None
+
+
+def _install_engine_hooks(engine, top: int) -> None:
+	@event.listens_for(engine, "before_cursor_execute")
+	def before(conn, cursor, statement, parameters, context, executemany):
+		conn.info.setdefault("instrumentation_started", []).append(time.perf_counter())
+
+	@event.listens_for(engine, "after_cursor_execute")
+	def after(conn, cursor, statement, parameters, context, executemany):
+		elapsed = time.perf_counter() - conn.info["instrumentation_started"].pop()
+		stats = _current()
+		if stats is None:
+			return
+		stats.queries += 1
+		stats.db_seconds += elapsed
+		entry = (elapsed, stats.queries, statement)
+		if len(stats.slowest) < top:
+			heapq.heappush(stats.slowest, entry)
+		elif elapsed > stats.slowest[0][0]:
+			heapq.heapreplace(stats.slowest, entry)
+
+
+def _template_started(sender, template, context, **extra):
+	stats = _current()
+	if stats is not None:
+		if stats.template_depth == 0:
+			stats.template_started = time.perf_counter()
+		stats.template_depth += 1
+
+
+def _template_finished(sender, template, context, **extra):
+	stats = _current()
+	if stats is not None and stats.template_depth:
+		stats.template_depth -= 1
+		if stats.template_depth == 0:
+			stats.template_seconds += time.perf_counter() - stats.template_started
+
+
+def _server_timing(stats: RequestStats, total: float) -> str:
+	return ", ".join((
+		f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+		f"tpl;dur={stats.template_seconds * 1000:.1f}",
+		f"total;dur={total * 1000:.1f}",
+	))
+
+
+def init_app(app: Flask, db) -> None:
+	# Opt-in: nothing is hooked into the engine or the request unless INSTRUMENTATION is on
+	if not app.config["INSTRUMENTATION"]:
+		return
+	top = app.config["INSTRUMENTATION_TOP_QUERIES"]
+	slow_seconds = app.config["SLOW_REQUEST_MS"] / 1000
+	with app.app_context():
+		for engine in db.engines.values():
+			_install_engine_hooks(engine, top)
+	before_render_template.connect(_template_started, app)
+	template_rendered.connect(_template_finished, app)
+
+	@app.before_request
+	def start_request():
+		g.instrumentation = RequestStats()
+
+	@app.after_request
+	def finish_request(response):
+		stats = g.pop("instrumentation", None)
+		if stats is None:
+			return response
+		total = time.perf_counter() - stats.started
+		route = request.endpoint or "<unmatched>"
+		slow = total >= slow_seconds
+		metrics.observe(route, request.method, response.status_code, total, stats, slow)
+		response.headers["Server-Timing"] = _server_timing(stats, total)
+		if slow:
+			log.warning(json.dumps({
+				"event": "slow_request",
+				"route": route,
+				"method": request.method,
+				"path": request.path,
+				"status": response.status_code,
+				"duration_ms": round(total * 1000, 1),
+				"db_ms": round(stats.db_seconds * 1000, 1),
+				"template_ms": round(stats.template_seconds * 1000, 1),
+				"queries": stats.queries,
+				"slowest": [
+					{"ms": round(seconds * 1000, 2), "n": n, "sql": " ".join(sql.split())[:STATEMENT_CHARS]}
+					for seconds, n, sql in sorted(stats.slowest, reverse=True)
+				],
+			}))
+		return response
@@ -0,0 +1,197 @@
+import json
+import logging
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, update
+from . import db
+from .models import Job, JobDedupeKey
+from .sqlutil import insert_or_ignore
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+log = logging.getLogger(__name__)
+jobs_cli = AppGroup("jobs", help="Background job queue.")
+
+# kind -> (handler taking a list of payloads, max payloads per call)
+_handlers: dict[str, tuple[Callable[[list[dict]], None], int]] = {}
+
+
+def handler(kind: str, batch_size: int = 1):
+	# Registers fn(payloads) for a job kind; same-kind jobs are handed over up to batch_size at a time
+	def decorator(fn):
+		_handlers[kind] = (fn, batch_size)
+		return fn
+	return decorator
+
+
+def registered_kinds() -> list[str]:
+	return sorted(_handlers)
+
+
+def enqueue(kind: str, payload: Optional[dict] = None, priority: int = 100, delay: float = 0, max_attempts: int = 5,
+		dedupe_key: Optional[str] = None) -> Optional[Job]:
+	# Added to the caller's session: the job commits (or rolls back) with the request's own changes.
+	# With a dedupe_key, only the first job ever enqueued for (kind, key) is kept; later ones return None.
+	if kind not in _handlers:
+		raise ValueError(f"Unknown job kind: {kind}")
+	if dedupe_key is not None and insert_or_ignore(
+		JobDedupeKey.__table__, {"kind": kind, "dedupe_key": dedupe_key, "created_at": datetime.utcnow()}, ("kind", "dedupe_key"),
+	) is None:
+		return None
+	job = Job(
+		kind=kind,
+		payload=json.dumps(payload or {}),
+		priority=priority,
+		max_attempts=max_attempts,
+		run_after=datetime.utcnow() + timedelta(seconds=delay),
+	)
+	db.session.add(job)
+	return job
+
+
+def pending(kind: str) -> bool:
+	# A job of this kind is waiting or running (the claim index leads with status)
+	return db.session.query(Job.job_id).filter(Job.status.in_((QUEUED, RUNNING)), Job.kind == kind).first() is not None
+
+
+def _requeue_stale(now: datetime) -> None:
+	# Jobs whose worker died mid-run go back on the queue once their lease runs out, unless that run was
+	# their last attempt: a job that keeps killing its worker stops being retried
+	stale = (Job.status == RUNNING, Job.locked_at < now - timedelta(seconds=current_app.config["JOB_LEASE_SECONDS"]))
+	db.session.execute(
+		update(Job)
+		.where(*stale, Job.attempts >= Job.max_attempts)
+		.values(status=FAILED, locked_by=None, locked_at=None, finished_at=now, last_error="Lease expired on the last attempt")
+	)
+	db.session.execute(
+		update(Job)
+		.where(*stale)
+		.values(status=QUEUED, locked_by=None, locked_at=None)
+	)
+
+
+def claim(worker_id: str) -> list[Job]:
+	now = datetime.utcnow()
+	_requeue_stale(now)
+	head = (
+		db.session.query(Job.kind)
+		.filter(Job.status == QUEUED, Job.run_after <= now, Job.kind.in_(list(_handlers)))
+		.order_by(Job.priority, Job.run_after, Job.job_id)
+		.first()
+	)
+	if not head:
+		db.session.commit()
+		return []
+	kind = head[0]
+	ids = [
+		row[0]
+		for row in db.session.query(Job.job_id)
+		.filter(Job.status == QUEUED, Job.kind == kind, Job.run_after <= now)
+		.order_by(Job.priority, Job.run_after, Job.job_id)
+		.limit(_handlers[kind][1])
+	]
+	# Conditional update: if another worker got there first, those rows simply don't match
+	db.session.execute(
+		update(Job)
+		.where(Job.job_id.in_(ids), Job.status == QUEUED)
+		.values(status=RUNNING, locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+	)
+	db.session.commit()
+	return (
+		db.session.query(Job)
+		.filter(Job.job_id.in_(ids), Job.status == RUNNING, Job.locked_by == worker_id)
+		.order_by(Job.job_id)
+		.all()
+	)
+
+
+def run_once(worker_id: str) -> int:
+	jobs = claim(worker_id)
+	if not jobs:
+		return 0
+	fn, _ = _handlers[jobs[0].kind]
+	try:
+		fn([json.loads(j.payload or "{}") for j in jobs])
+	except Exception:
+		db.session.rollback()
+		error = traceback.format_exc(limit=5)
+		log.exception("Job batch %s failed", [j.job_id for j in jobs])
+		now = datetime.utcnow()
+		for job in jobs:
+			job.last_error = error
+			job.locked_by = None
+			job.locked_at = None
+			if job.attempts >= job.max_attempts:
+				job.status = FAILED
+				job.finished_at = now
+			else:
+				# Exponential backoff: 2s, 4s, 8s, ...
+				job.status = QUEUED
+				job.run_after = now + timedelta(seconds=current_app.config["JOB_RETRY_BASE_SECONDS"] * 2 ** (job.attempts - 1))
+		db.session.commit()
+		return len(jobs)
+	now = datetime.utcnow()
+	for job in jobs:
+		job.status = DONE
+		job.finished_at = now
+		job.locked_by = None
+	db.session.commit()
+	return len(jobs)
+
+
+def queue_depth() -> list[dict]:
+	now = datetime.utcnow()
+	rows = (
+		db.session.query(Job.kind, Job.status, func.count(Job.job_id), func.min(Job.run_after))
+		.group_by(Job.kind, Job.status)
+		.order_by(Job.kind, Job.status)
+		.all()
+	)
+	return [
+		{
+			"kind": kind,
+			"status": status,
+			"count": count,
+			"oldest_seconds": int((now - oldest).total_seconds()) if oldest and status == QUEUED else None,
+		}
+		for kind, status, count, oldest in rows
+	]
+
+
+def recent_failures(limit: int = 20) -> list[Job]:
+	return (
+		db.session.query(Job)
+		.filter(Job.status == FAILED)
+		.order_by(Job.finished_at.desc())
+		.limit(limit)
+		.all()
+	)
+
+
+@jobs_cli.command("purge")
+@click.option("--days", type=int, default=7, help="Delete finished jobs older than this.")
+def purge_command(days: int):
+	"""Delete completed jobs (failed ones are kept for inspection)."""
+	cutoff = datetime.utcnow() - timedelta(days=days)
+	count = db.session.query(Job).filter(Job.status == DONE, Job.finished_at < cutoff).delete(synchronize_session=False)
+	db.session.commit()
+	click.echo(f"Purged {count} job(s)")
+
+
+@jobs_cli.command("retry")
+def retry_command():
+	"""Put every failed job back on the queue."""
+	count = (
+		db.session.query(Job)
+		.filter(Job.status == FAILED)
+		.update({"status": QUEUED, "attempts": 0, "run_after": datetime.utcnow()}, synchronize_session=False)
+	)
+	db.session.commit()
+	click.echo(f"Requeued {count} job(s)")
@@ -0,0 +1,185 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Iterable, Optional
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func, insert, select, update
+from . import db
+from .models import AllocationEntry, Application, Finance, Scholarship
+from .sqlutil import chunked
+
+APPROVAL = "approval"
+REVERSAL = "reversal"
+OPENING = "opening"
+
+ledger_cli = AppGroup("ledger", help="Finance allocation ledger.")
+
+
+def _balance_expr(budget, allocated):
+	return case((budget - allocated > 0, budget - allocated), else_=0.0)
+
+
+def adjust_year(year: int, delta: float) -> None:
+	# Single-statement increment: concurrent workers can't lose each other's updates.
+	# balance is assigned first so MySQL's left-to-right SET still sees the old allocated value.
+	if not delta:
+		return
+	db.session.execute(
+		update(Finance)
+		.where(Finance.year == year)
+		.ordered_values(
+			(Finance.balance_amount, _balance_expr(Finance.budget_amount, Finance.allocated_amount + delta)),
+			(Finance.allocated_amount, Finance.allocated_amount + delta),
+		)
+	)
+
+
+def set_budget(year: int, budget: float) -> None:
+	res = db.session.execute(
+		update(Finance)
+		.where(Finance.year == year)
+		.values(budget_amount=budget, balance_amount=_balance_expr(budget, Finance.allocated_amount))
+	)
+	if not res.rowcount:
+		# A new year picks up anything already approved against it
+		allocated = year_total(year)
+		fund = Finance(year=year, budget_amount=budget, allocated_amount=allocated)
+		fund.recalc()
+		db.session.add(fund)
+
+
+def year_total(year: int) -> float:
+	return float(
+		db.session.query(func.coalesce(func.sum(AllocationEntry.amount), 0))
+		.filter(AllocationEntry.year == year)
+		.scalar() or 0
+	)
+
+
+def net_allocations(application_ids: Iterable[int]) -> dict[int, dict[int, float]]:
+	ids = list(application_ids)
+	out: dict[int, dict[int, float]] = defaultdict(dict)
+	if not ids:
+		return out
+	rows = (
+		db.session.query(AllocationEntry.application_id, AllocationEntry.year, func.sum(AllocationEntry.amount))
+		.filter(AllocationEntry.application_id.in_(ids))
+		.group_by(AllocationEntry.application_id, AllocationEntry.year)
+		.all()
+	)
+	for app_id, year, total in rows:
+		if total:
+			out[app_id][year] = float(total)
+	return out
+
+
+def plan_entries(application_id: int, new_status: str, amount: float, net: dict[int, float], year: int) -> list[dict]:
+	# Approving something already allocated, or rejecting something never allocated, posts nothing
+	if new_status == "approved":
+		if sum(net.values()):
+			return []
+		return [{"application_id": application_id, "year": year, "amount": float(amount), "kind": APPROVAL}]
+	return [
+		{"application_id": application_id, "year": y, "amount": -total, "kind": REVERSAL}
+		for y, total in net.items()
+		if total
+	]
+
+
+def post(entries: list[dict], user_id: Optional[int]) -> None:
+	if not entries:
+		return
+	now = datetime.utcnow()
+	db.session.execute(
+		insert(AllocationEntry),
+		[{**e, "created_by": user_id, "created_at": now} for e in entries],
+	)
+	per_year: dict[int, float] = defaultdict(float)
+	for e in entries:
+		per_year[e["year"]] += e["amount"]
+	for year, delta in per_year.items():
+		adjust_year(year, delta)
+
+
+def record_decision(app: Application, new_status: str, user_id: Optional[int]) -> None:
+	net = net_allocations([app.application_id]).get(app.application_id, {})
+	entries = plan_entries(app.application_id, new_status, app.scholarship.amount, net, date.today().year)
+	post(entries, user_id)
+
+
+def scholarship_deleted(sch: Scholarship, user_id: Optional[int]) -> None:
+	# Reverse whatever its applications still hold before they go: application ids can be reused
+	# afterwards, and a new application must not inherit a live allocation
+	ids = db.session.execute(select(Application.application_id).where(Application.scholarship_id == sch.scholarship_id)).scalars().all()
+	entries = []
+	for chunk in chunked(ids):
+		for app_id, net in net_allocations(chunk).items():
+			entries.extend(plan_entries(app_id, "rejected", sch.amount, net, date.today().year))
+	post(entries, user_id)
+
+
+def fund_report(year: int) -> dict:
+	row = db.session.execute(
+		select(Finance.budget_amount, Finance.allocated_amount, Finance.balance_amount).where(Finance.year == year)
+	).first()
+	if not row:
+		return {"year": year, "budget": 0, "allocated": 0, "balance": 0}
+	return {"year": year, "budget": row[0], "allocated": row[1], "balance": row[2]}
+
+
+@ledger_cli.command("backfill")
+@click.option("--accept-submission-year", is_flag=True, help="Book openings to the submission year even where that disagrees with the yearly totals.")
+def backfill_command(accept_submission_year: bool):
+	"""Add opening entries for approved applications that predate the ledger."""
+	# Approvals were charged to the year they were decided in, but no decision date was stored. The submission
+	# year is the closest record; where it disagrees with the yearly totals, the rebooking needs a yes.
+	has_entry = select(AllocationEntry.application_id).where(AllocationEntry.application_id == Application.application_id).exists()
+	rows = (
+		db.session.query(Application.application_id, Application.submitted_date, Scholarship.amount)
+		.join(Scholarship, Scholarship.scholarship_id == Application.scholarship_id)
+		.filter(Application.status == "approved", ~has_entry)
+		.all()
+	)
+	now = datetime.utcnow()
+	entries = [
+		{"application_id": app_id, "year": submitted.year, "amount": float(amount), "kind": OPENING, "created_at": now}
+		for app_id, submitted, amount in rows
+	]
+	opening: dict[int, float] = defaultdict(float)
+	for e in entries:
+		opening[e["year"]] += e["amount"]
+	booked = dict(db.session.query(Finance.year, Finance.allocated_amount).all())
+	years = sorted(set(opening) | set(booked))
+	mismatched = [y for y in years if abs(year_total(y) + opening.get(y, 0) - float(booked.get(y) or 0)) >= 0.005]
+	if entries and mismatched:
+		click.echo("The original approval year can't be recovered; by submission year the openings disagree with the yearly totals:")
+		for y in mismatched:
+			click.echo(f"  {y}: finance allocated {float(booked.get(y) or 0)}, ledger would hold {year_total(y) + opening.get(y, 0)}")
+		if not accept_submission_year:
+			click.echo("Nothing written. Rerun with --accept-submission-year to book them anyway ('ledger reconcile' will then report these years).")
+			raise SystemExit(1)
+	if entries:
+		db.session.execute(insert(AllocationEntry), entries)
+	db.session.commit()
+	click.echo(f"Added {len(entries)} opening entries")
+
+
+@ledger_cli.command("reconcile")
+@click.option("--fix", is_flag=True, help="Overwrite drifted yearly totals with the ledger sum.")
+def reconcile_command(fix: bool):
+	"""Compare each year's allocated total against the ledger."""
+	totals = dict(
+		db.session.query(AllocationEntry.year, func.sum(AllocationEntry.amount)).group_by(AllocationEntry.year).all()
+	)
+	drifted = 0
+	for fund in db.session.query(Finance).order_by(Finance.year).all():
+		expected = float(totals.get(fund.year) or 0)
+		if abs(expected - float(fund.allocated_amount)) < 0.005:
+			continue
+		drifted += 1
+		click.echo(f"{fund.year}: allocated {fund.allocated_amount} != ledger {expected}")
+		if fix:
+			fund.allocated_amount = expected
+			fund.recalc()
+	db.session.commit()
+	click.echo(f"{drifted} year(s) drifted" + (" and fixed" if fix and drifted else ""))
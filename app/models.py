@@ -1,9 +1,10 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 from . import db, login_manager
+from .cache import TTLCache
 from flask_login import UserMixin
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, ForeignKey, Date, DateTime, Text, Float, CheckConstraint
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship, make_transient_to_detached, object_session
+from sqlalchemy import event, String, Integer, ForeignKey, Date, DateTime, Text, Float, CheckConstraint, Index
 
 
 class User(db.Model, UserMixin):
@@ -29,9 +30,54 @@ class User(db.Model, UserMixin):
 		return str(self.user_id)
 
 
+# Columns cached per user id; enough for current_user and role checks without a query
+IDENTITY_FIELDS = ("user_id", "name", "email", "role", "department", "cgpa", "family_income")
+user_cache = TTLCache(maxsize=10000, ttl=30)
+
+
+def user_identity(user: User) -> dict:
+	return {f: getattr(user, f) for f in IDENTITY_FIELDS}
+
+
+def attach_user(identity: dict) -> User:
+	# Rebuild a persistent User from cached columns without a SELECT; anything not
+	# given (password_hash, relationships, fields left out) still loads lazily if it's touched
+	user = User(**{f: identity[f] for f in IDENTITY_FIELDS if f in identity})
+	make_transient_to_detached(user)
+	return db.session.merge(user, load=False)
+
+
 @login_manager.user_loader
 def load_user(user_id: str) -> Optional["User"]:
-	return db.session.get(User, int(user_id))
+	uid = int(user_id)
+	identity = user_cache.get(uid)
+	if identity is not None:
+		return attach_user(identity)
+	user = db.session.get(User, uid)
+	if user is not None:
+		user_cache.set(uid, user_identity(user))
+	return user
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target: User) -> None:
+	# Evicted now and again once the change is committed, so no request re-caches the old row
+	user_cache.pop(target.user_id)
+	sess = object_session(target)
+	if sess is not None:
+		sess.info.setdefault("changed_user_ids", set()).add(target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_users(session: Session) -> None:
+	for uid in session.info.pop("changed_user_ids", ()):
+		user_cache.pop(uid)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back_users(session: Session, previous_transaction) -> None:
+	session.info.pop("changed_user_ids", None)
 
 
 class Scholarship(db.Model):
@@ -74,6 +120,11 @@ class Application(db.Model):
 
 	__table_args__ = (
 		CheckConstraint("cgpa_value IS NULL OR (cgpa_value >= 0 AND cgpa_value <= 10)", name="ck_cgpa_range"),
+		# Keyset pagination on the review listing, with and without a status filter
+		Index("ix_applications_submitted", "submitted_date", "application_id"),
+		Index("ix_applications_status_submitted", "status", "submitted_date", "application_id"),
+		# One application per student and scholarship, enforced by the database rather than a prior SELECT
+		Index("uq_applications_student_scholarship", "student_id", "scholarship_id", unique=True),
 	)
 
 
@@ -88,3 +139,108 @@ class Finance(db.Model):
 
 	def recalc(self) -> None:
 		self.balance_amount = max(0.0, float(self.budget_amount) - float(self.allocated_amount))
+
+
+class StatCounter(db.Model):
+	__tablename__ = "stat_counters"
+
+	key: Mapped[str] = mapped_column(String(120), primary_key=True)
+	value: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+
+class ApplicationReportKey(db.Model):
+	__tablename__ = "application_report_keys"
+
+	# The student's department when the application was submitted, i.e. the daily_rollups row it was
+	# counted in; decisions go to the same row even if the student changes department later
+	application_id: Mapped[int] = mapped_column(ForeignKey("applications.application_id", ondelete="CASCADE"), primary_key=True)
+	department: Mapped[str] = mapped_column(String(80), nullable=False, default="")
+
+
+class DailyRollup(db.Model):
+	__tablename__ = "daily_rollups"
+
+	# Applications by submission day, scholarship category and the student's department at submission ("" when unset).
+	# Status counts and the allocation follow later decisions; turnaround covers first decisions only.
+	day: Mapped[date] = mapped_column(Date, primary_key=True)
+	category: Mapped[str] = mapped_column(String(50), primary_key=True)
+	department: Mapped[str] = mapped_column(String(80), primary_key=True)
+	submitted: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	approved: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	rejected: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	allocated: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+	decided: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	turnaround_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+
+class DataVersion(db.Model):
+	__tablename__ = "data_versions"
+
+	# Bumped in the same transaction as a change to the named data set; cache keys include it
+	name: Mapped[str] = mapped_column(String(50), primary_key=True)
+	version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(db.Model):
+	__tablename__ = "idempotency_keys"
+
+	# The first response to a keyed submission, replayed to retries of the same request
+	user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	key: Mapped[str] = mapped_column(String(100), primary_key=True)
+	fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+	status_code: Mapped[int] = mapped_column(Integer, nullable=False)
+	response: Mapped[str] = mapped_column(Text, nullable=False)
+	created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class LoginFailure(db.Model):
+	__tablename__ = "login_failures"
+
+	# Failed logins per throttle key ("email:..." or "ip:...") and time bucket, shared by every worker
+	key: Mapped[str] = mapped_column(String(330), primary_key=True)
+	bucket: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)  # unix time // bucket length
+	failures: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class AllocationEntry(db.Model):
+	__tablename__ = "allocation_ledger"
+
+	# Append-only: approvals post the scholarship amount, reversals post its negation
+	entry_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	application_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+	year: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+	amount: Mapped[float] = mapped_column(Float, nullable=False)
+	kind: Mapped[str] = mapped_column(String(20), nullable=False)
+	created_by: Mapped[Optional[int]] = mapped_column(Integer)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class Job(db.Model):
+	__tablename__ = "jobs"
+
+	job_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+	kind: Mapped[str] = mapped_column(String(50), nullable=False)
+	payload: Mapped[str] = mapped_column(Text, nullable=False, default="{}")
+	priority: Mapped[int] = mapped_column(Integer, nullable=False, default=100)  # lower runs first
+	status: Mapped[str] = mapped_column(String(20), nullable=False, default="queued")
+	attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+	max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=5)
+	run_after: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+	locked_by: Mapped[Optional[str]] = mapped_column(String(100))
+	locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+	last_error: Mapped[Optional[str]] = mapped_column(Text)
+	created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+	finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+	__table_args__ = (
+		Index("ix_jobs_claim", "status", "priority", "run_after"),
+	)
+
+
+class JobDedupeKey(db.Model):
+	__tablename__ = "job_dedupe_keys"
+
+	# One row per (kind, key) ever enqueued with a dedupe key: a primary-key probe instead of searching payloads
+	kind: Mapped[str] = mapped_column(String(50), primary_key=True)
+	dedupe_key: Mapped[str] = mapped_column(String(255), primary_key=True)
+	created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
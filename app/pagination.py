@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+from . import db
+from .models import Application, Scholarship
+
+APPLICATION_STATUSES = {"pending", "approved", "rejected"}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(*values) -> str:
+	raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+	return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+	if not cursor:
+		return None
+	try:
+		padded = cursor + "=" * (-len(cursor) % 4)
+		values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+	except Exception:
+		return None
+	return values if isinstance(values, list) else None
+
+
+def page_size(raw, default: int = DEFAULT_PAGE_SIZE) -> int:
+	try:
+		size = int(raw) if raw else default
+	except (TypeError, ValueError):
+		size = default
+	return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def applications_page(status: Optional[str], cursor: Optional[str], limit: int):
+	# Newest first, keyed on (submitted_date, application_id) so every page is an index range scan
+	q = db.session.query(Application).options(
+		joinedload(Application.student),
+		joinedload(Application.scholarship),
+		joinedload(Application.reviewer),
+	)
+	if status in APPLICATION_STATUSES:
+		q = q.filter(Application.status == status)
+	after = decode_cursor(cursor)
+	if after and len(after) == 2:
+		try:
+			after_date = datetime.fromisoformat(after[0])
+			after_id = int(after[1])
+		except (TypeError, ValueError):
+			after_date = None
+		if after_date is not None:
+			q = q.filter(or_(
+				Application.submitted_date < after_date,
+				and_(Application.submitted_date == after_date, Application.application_id < after_id),
+			))
+	rows = (
+		q.order_by(Application.submitted_date.desc(), Application.application_id.desc())
+		.limit(limit + 1)
+		.all()
+	)
+	items = rows[:limit]
+	next_cursor = None
+	if len(rows) > limit:
+		last = items[-1]
+		next_cursor = encode_cursor(last.submitted_date, last.application_id)
+	return items, next_cursor
+
+
+def scholarships_page(filters: dict, cursor: Optional[str], limit: int):
+	# Keyed on scholarship_id ascending; filters narrow the set before the range, so pages never overlap
+	q = db.session.query(Scholarship)
+	if filters.get("category"):
+		q = q.filter(Scholarship.category.in_(filters["category"]))
+	if filters.get("active_on"):
+		on = filters["active_on"]
+		q = q.filter(Scholarship.start_date <= on, Scholarship.end_date >= on)
+	if filters.get("min_amount") is not None:
+		q = q.filter(Scholarship.amount >= filters["min_amount"])
+	if filters.get("max_amount") is not None:
+		q = q.filter(Scholarship.amount <= filters["max_amount"])
+	after = decode_cursor(cursor)
+	if after and len(after) == 1 and isinstance(after[0], int):
+		q = q.filter(Scholarship.scholarship_id > after[0])
+	rows = q.order_by(Scholarship.scholarship_id).limit(limit + 1).all()
+	items = rows[:limit]
+	next_cursor = encode_cursor(items[-1].scholarship_id) if len(rows) > limit else None
+	return items, next_cursor
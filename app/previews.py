@@ -0,0 +1,109 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Iterable
+from flask import current_app, g
+from PIL import Image, ImageOps
+from . import db
+from .storage import preview_path
+from .jobs import enqueue, handler
+
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png"}
+JOB_KIND = "previews.generate"
+
+log = logging.getLogger(__name__)
+
+
+def _source(root: str, rel: str) -> str:
+	return rel if os.path.isabs(rel) else os.path.join(root, rel)
+
+
+def _render_image(src: str, out: str, size: int) -> bool:
+	with Image.open(src) as img:
+		img.draft("RGB", (size, size))  # JPEG: decode at reduced scale
+		img = ImageOps.exif_transpose(img)
+		img.thumbnail((size, size))
+		img.convert("RGB").save(out, "JPEG", quality=70, optimize=True)
+	return True
+
+
+def _render_pdf(src: str, out: str, size: int) -> bool:
+	# First page via poppler when it's installed; Pillow can't rasterise PDFs itself
+	pdftoppm = shutil.which("pdftoppm")
+	if not pdftoppm:
+		return False
+	prefix = out[:-len(".jpg")] if out.endswith(".jpg") else out
+	subprocess.run(
+		[pdftoppm, "-jpeg", "-f", "1", "-l", "1", "-scale-to", str(size), "-singlefile", src, prefix],
+		check=True, timeout=30, capture_output=True,
+	)
+	if prefix + ".jpg" != out:
+		os.replace(prefix + ".jpg", out)
+	return True
+
+
+def generate(root: str, rel: str, size: int) -> bool:
+	src = _source(root, rel)
+	dest = os.path.join(root, preview_path(rel))
+	if os.path.exists(dest) or not os.path.isfile(src):
+		return os.path.exists(dest)
+	ext = rel.rsplit(".", 1)[-1].lower()
+	os.makedirs(os.path.dirname(dest), exist_ok=True)
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".jpg")
+	os.close(fd)
+	try:
+		if ext in IMAGE_EXTENSIONS:
+			ok = _render_image(src, tmp, size)
+		elif ext == "pdf":
+			ok = _render_pdf(src, tmp, size)
+		else:
+			ok = False
+		if ok:
+			os.replace(tmp, dest)
+		return ok
+	finally:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+
+
+def schedule(paths: Iterable[str]) -> None:
+	# One job per document, added to the caller's session. The document path is the dedupe key, so one
+	# that already had a job (waiting, running, or finished without a preview) isn't queued again.
+	for rel in dict.fromkeys(p for p in paths if p):
+		enqueue(JOB_KIND, {"paths": [rel]}, priority=50, dedupe_key=rel)
+
+
+def preview_url(stored_path: str) -> str:
+	# Jinja filter: URL of the small preview if it exists yet, else "" (and one gets queued after the response)
+	if not stored_path:
+		return ""
+	rel = preview_path(stored_path)
+	if os.path.exists(os.path.join(current_app.config["UPLOAD_FOLDER"], rel)):
+		return f"/uploads/{rel}"
+	ext = stored_path.rsplit(".", 1)[-1].lower()
+	if ext in IMAGE_EXTENSIONS or (ext == "pdf" and shutil.which("pdftoppm")):
+		g.setdefault("missing_previews", set()).add(stored_path)
+	return ""
+
+
+def queue_missing(response):
+	# after_request hook: the page rendered already, so its own work is done and committing the jobs is safe
+	paths = g.pop("missing_previews", None)
+	if paths and response.status_code < 400:
+		schedule(sorted(paths))
+		db.session.commit()
+	return response
+
+
+@handler(JOB_KIND, batch_size=20)
+def generate_job(payloads: list[dict]) -> None:
+	cfg = current_app.config
+	for payload in payloads:
+		for rel in payload.get("paths", []):
+			try:
+				generate(cfg["UPLOAD_FOLDER"], rel, cfg["PREVIEW_SIZE"])
+			except Exception:
+				# A bad document won't get better on retry; don't hold the rest of the batch hostage
+				log.exception("Preview generation failed for %s", rel)
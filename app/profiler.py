@@ -0,0 +1,185 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+from flask import Flask, g, request
+from flask_login import current_user
+
+HEADER = "X-Profile"
+SUFFIX = ".folded"
+
+_write_lock = threading.Lock()
+
+
+def _frame_name(frame) -> str:
+	return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def collapse(frame) -> str:
+	# Root first, semicolon separated: the "collapsed stack" input of flamegraph.pl / speedscope
+	names = []
+	while frame is not None:
+		names.append(_frame_name(frame))
+		frame = frame.f_back
+	return ";".join(reversed(names))
+
+
+class Sampler:
+	# One daemon thread per process samples the stacks of every thread with a request being profiled.
+	# It sleeps on an event while nothing is profiled, so requests that aren't sampled cost nothing here.
+	def __init__(self, interval: float = 0.005):
+		self.interval = interval
+		self._lock = threading.Lock()
+		self._wake = threading.Event()
+		self._targets: dict[int, Counter] = {}
+		self._thread: Optional[threading.Thread] = None
+
+	def start(self, ident: int) -> None:
+		with self._lock:
+			self._targets[ident] = Counter()
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+				self._thread.start()
+			self._wake.set()
+
+	def stop(self, ident: int) -> Counter:
+		with self._lock:
+			return self._targets.pop(ident, Counter())
+
+	def _run(self) -> None:
+		while True:
+			with self._lock:
+				if not self._targets:
+					self._wake.clear()
+			self._wake.wait()
+			frames = sys._current_frames()
+			with self._lock:
+				for ident, counts in self._targets.items():
+					frame = frames.get(ident)
+					if frame is not None:
+						counts[collapse(frame)] += 1
+			del frames
+			time.sleep(self.interval)
+
+
+sampler = Sampler()
+
+
+def _profile_file(directory: Path, route: str) -> Path:
+	stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+	return directory / f"{stamp}-{os.getpid()}-{route}{SUFFIX}"
+
+
+def _route_of(path: Path) -> str:
+	return path.name[:-len(SUFFIX)].split("-", 2)[2]
+
+
+def write_profile(directory: Path, route: str, counts: Counter, keep: int) -> Path:
+	directory.mkdir(parents=True, exist_ok=True)
+	path = _profile_file(directory, route)
+	path.write_text("".join(f"{stack} {n}\n" for stack, n in counts.most_common()), encoding="utf-8")
+	with _write_lock:
+		# Names start with a UTC timestamp, so sorting them puts the oldest first
+		profiles = sorted(directory.glob(f"*{SUFFIX}"))
+		for old in profiles[:max(0, len(profiles) - keep)]:
+			old.unlink(missing_ok=True)
+	return path
+
+
+def _read(path: Path) -> Counter:
+	counts = Counter()
+	try:
+		text = path.read_text(encoding="utf-8")
+	except FileNotFoundError:  # rotated away while we listed the directory
+		return counts
+	for line in text.splitlines():
+		stack, _, n = line.rpartition(" ")
+		if stack and n.isdigit():
+			counts[stack] += int(n)
+	return counts
+
+
+def merged(directory: Path, route: str) -> Counter:
+	counts = Counter()
+	for path in sorted(directory.glob(f"*{SUFFIX}")):
+		if _route_of(path) == route:
+			counts.update(_read(path))
+	return counts
+
+
+def hot_functions(directory: Path, limit: int = 15) -> list[dict]:
+	# Per route: samples where a function was running (self) and where it was anywhere on the stack (total)
+	routes: dict[str, dict] = defaultdict(lambda: {"profiles": 0, "samples": 0, "self": Counter(), "total": Counter()})
+	for path in sorted(directory.glob(f"*{SUFFIX}")) if directory.is_dir() else []:
+		entry = routes[_route_of(path)]
+		entry["profiles"] += 1
+		for stack, n in _read(path).items():
+			frames = stack.split(";")
+			entry["samples"] += n
+			entry["self"][frames[-1]] += n
+			for name in set(frames):
+				entry["total"][name] += n
+	report = []
+	for route, entry in sorted(routes.items(), key=lambda kv: -kv[1]["samples"]):
+		report.append({
+			"route": route,
+			"profiles": entry["profiles"],
+			"samples": entry["samples"],
+			"functions": [
+				{"name": name, "self": n, "total": entry["total"][name]}
+				for name, n in entry["self"].most_common(limit)
+			],
+			# Our own code by inclusive time: which view or helper the library time above is spent under
+			"app_functions": [
+				{"name": name, "total": n}
+				for name, n in entry["total"].most_common()
+				if name.startswith("app.")
+			][:limit],
+		})
+	return report
+
+
+def _wanted(routes: frozenset, rate: float) -> bool:
+	if request.endpoint in routes:
+		return True
+	if rate and random.random() < rate:
+		return True
+	# Admins can ask for a profile of any single request; the user is only loaded when the header is sent
+	return bool(request.headers.get(HEADER)) and current_user.is_authenticated and current_user.role == "admin"
+
+
+def init_app(app: Flask) -> None:
+	sampler.interval = app.config["PROFILE_INTERVAL_MS"] / 1000
+	routes = frozenset(r.strip() for r in app.config["PROFILE_ROUTES"].split(",") if r.strip())
+	rate = app.config["PROFILE_SAMPLE_RATE"]
+	directory = Path(app.config["PROFILE_DIR"])
+	keep = app.config["PROFILE_KEEP"]
+
+	@app.before_request
+	def start_profile():
+		if _wanted(routes, rate):
+			g.profile_thread = threading.get_ident()
+			sampler.start(g.profile_thread)
+
+	@app.after_request
+	def finish_profile(response):
+		ident = g.pop("profile_thread", None)
+		if ident is None:
+			return response
+		counts = sampler.stop(ident)
+		if counts:
+			path = write_profile(directory, request.endpoint or "unmatched", counts, keep)
+			response.headers[HEADER] = f"{path.name}; samples={sum(counts.values())}"
+		return response
+
+	@app.teardown_request
+	def drop_profile(exc):
+		# A request that raised never reaches after_request
+		ident = g.pop("profile_thread", None)
+		if ident is not None:
+			sampler.stop(ident)
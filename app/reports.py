@@ -0,0 +1,254 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Date, case, delete, func, insert, select, update
+from . import db
+from .jobs import handler
+from .ledger import APPROVAL
+from .models import AllocationEntry, Application, ApplicationReportKey, DailyRollup, Scholarship, User
+from .sqlutil import insert_or_ignore, upsert_increment
+
+FIELDS = ("submitted", "approved", "rejected", "allocated", "decided", "turnaround_seconds")
+COUNT_FIELDS = FIELDS[:4]  # recomputable from applications; turnaround is measured as decisions happen
+DECIDED_STATUSES = ("approved", "rejected")
+INTERVALS = ("day", "week", "month", "year")
+BREAKDOWNS = ("category", "department", "year")
+MAX_DAYS = 3660
+
+reports_cli = AppGroup("reports", help="Daily reporting rollups.")
+
+# Rollup department of an application: the one recorded at submission, else (applications from before
+# the keys, or bulk-generated ones) the student's current department. Use with with_department().
+department = func.coalesce(ApplicationReportKey.department, User.department)
+
+
+def _key(day: date, category: Optional[str], department: Optional[str]) -> tuple:
+	return day, category or "", department or ""
+
+
+def with_department(query):
+	return (
+		query.join(User, User.user_id == Application.student_id)
+		.outerjoin(ApplicationReportKey, ApplicationReportKey.application_id == Application.application_id)
+	)
+
+
+def bump(deltas: dict[tuple, Counter]) -> None:
+	# Same transaction as the change it describes; one upsert per touched (day, category, department)
+	rows = [
+		{"day": day, "category": category, "department": department, **{f: values.get(f, 0) for f in FIELDS}}
+		for (day, category, department), values in deltas.items()
+		if any(values.values())
+	]
+	upsert_increment(DailyRollup.__table__, rows, ("day", "category", "department"), FIELDS)
+
+
+def application_submitted(application_id: int, submitted: datetime, category: Optional[str], department: Optional[str]) -> None:
+	# A leftover key for a reused application_id (deleted outside scholarship_deleted) is overwritten, not a 500
+	values = {"application_id": application_id, "department": department or ""}
+	if insert_or_ignore(ApplicationReportKey.__table__, values, ("application_id",)) is None:
+		db.session.execute(update(ApplicationReportKey).where(ApplicationReportKey.application_id == application_id).values(department=values["department"]))
+	bump({_key(submitted.date(), category, department): Counter(submitted=1)})
+
+
+def add_decision(deltas: dict[tuple, Counter], submitted: datetime, category: Optional[str], department: Optional[str],
+		old_status: str, new_status: str, amount: float, now: datetime) -> None:
+	if old_status == new_status:
+		return
+	values = deltas[_key(submitted.date(), category, department)]
+	if old_status in DECIDED_STATUSES:
+		values[old_status] -= 1
+	if new_status in DECIDED_STATUSES:
+		values[new_status] += 1
+	if new_status == "approved":
+		values["allocated"] += float(amount)
+	elif old_status == "approved":
+		values["allocated"] -= float(amount)
+	if old_status == "pending":
+		values["decided"] += 1
+		values["turnaround_seconds"] += max(0.0, (now - submitted).total_seconds())
+
+
+def application_decided(app: Application, old_status: str, new_status: str) -> None:
+	deltas: dict[tuple, Counter] = defaultdict(Counter)
+	submitted_department = db.session.execute(
+		with_department(select(department).select_from(Application)).where(Application.application_id == app.application_id)
+	).scalar()
+	add_decision(
+		deltas, app.submitted_date, app.scholarship.category, submitted_department,
+		old_status, new_status, app.scholarship.amount, datetime.utcnow(),
+	)
+	bump(deltas)
+
+
+def scholarship_deleted(sch: Scholarship) -> None:
+	# Its applications go with it through the ORM cascade. Turnaround already measured stays in the averages.
+	rows = db.session.execute(
+		with_department(select(func.date(Application.submitted_date, type_=Date), department, Application.status, func.count(Application.application_id)))
+		.where(Application.scholarship_id == sch.scholarship_id)
+		.group_by(func.date(Application.submitted_date, type_=Date), department, Application.status)
+	)
+	deltas: dict[tuple, Counter] = defaultdict(Counter)
+	for day, dept, status, count in rows:
+		values = deltas[_key(day, sch.category, dept)]
+		values["submitted"] -= count
+		if status in DECIDED_STATUSES:
+			values[status] -= count
+		if status == "approved":
+			values["allocated"] -= count * float(sch.amount)
+	bump(deltas)
+	# Explicitly: SQLite runs without foreign_keys=ON, so the FK cascade can't be relied on, and the ids get reused
+	db.session.execute(
+		delete(ApplicationReportKey)
+		.where(ApplicationReportKey.application_id.in_(select(Application.application_id).where(Application.scholarship_id == sch.scholarship_id)))
+	)
+
+
+def _ledger_turnaround(rollup: dict[tuple, Counter]) -> None:
+	first_approval = (
+		select(AllocationEntry.application_id, func.min(AllocationEntry.created_at).label("decided_at"))
+		.where(AllocationEntry.kind == APPROVAL)
+		.group_by(AllocationEntry.application_id)
+		.subquery()
+	)
+	decided = db.session.execute(
+		with_department(
+			select(Application.submitted_date, Scholarship.category, department, first_approval.c.decided_at)
+			.join(first_approval, first_approval.c.application_id == Application.application_id)
+			.join(Scholarship, Scholarship.scholarship_id == Application.scholarship_id)
+		)
+		.where(Application.status == "approved")
+		.execution_options(yield_per=10_000)
+	)
+	for submitted, category, dept, decided_at in decided:
+		values = rollup[_key(submitted.date(), category, dept)]
+		values["decided"] += 1
+		values["turnaround_seconds"] += max(0.0, (decided_at - submitted).total_seconds())
+
+
+def rebuild(turnaround_from_ledger: bool = False) -> int:
+	# Counts and allocations are recomputed exactly. Decision times aren't stored on applications, so the
+	# turnaround measured as decisions happened is kept; turnaround_from_ledger replaces it with an estimate
+	# from the first ledger approval of each approved application, which drops every rejection's.
+	if turnaround_from_ledger:
+		db.session.query(DailyRollup).delete()
+	else:
+		db.session.query(DailyRollup).update({f: 0 for f in COUNT_FIELDS}, synchronize_session=False)
+	db.session.execute(
+		delete(ApplicationReportKey)
+		.where(ApplicationReportKey.application_id.not_in(select(Application.application_id)))
+	)
+	# Applications without a recorded department are pinned to the one they're counted under now
+	db.session.execute(insert(ApplicationReportKey).from_select(
+		["application_id", "department"],
+		with_department(select(Application.application_id, func.coalesce(User.department, "")).select_from(Application))
+		.where(ApplicationReportKey.application_id.is_(None)),
+	))
+	day = func.date(Application.submitted_date, type_=Date)
+	rollup: dict[tuple, Counter] = defaultdict(Counter)
+	rows = db.session.execute(
+		with_department(select(
+			day, Scholarship.category, department,
+			func.count(Application.application_id),
+			func.sum(case((Application.status == "approved", 1), else_=0)),
+			func.sum(case((Application.status == "rejected", 1), else_=0)),
+			func.sum(case((Application.status == "approved", Scholarship.amount), else_=0)),
+		).join(Scholarship, Scholarship.scholarship_id == Application.scholarship_id))
+		.group_by(day, Scholarship.category, department)
+	)
+	for d, category, dept, submitted, approved, rejected, allocated in rows:
+		rollup[_key(d, category, dept)].update(
+			submitted=submitted, approved=approved or 0, rejected=rejected or 0, allocated=float(allocated or 0)
+		)
+	if turnaround_from_ledger:
+		_ledger_turnaround(rollup)
+	bump(rollup)
+	db.session.flush()
+	return len(rollup)
+
+
+def _period(day: date, interval: str) -> str:
+	if interval == "week":
+		return (day - timedelta(days=day.weekday())).isoformat()
+	if interval == "month":
+		return day.strftime("%Y-%m")
+	if interval == "year":
+		return str(day.year)
+	return day.isoformat()
+
+
+def _totals(values: dict) -> dict:
+	submitted = int(values.get("submitted", 0))
+	approved = int(values.get("approved", 0))
+	rejected = int(values.get("rejected", 0))
+	decided = int(values.get("decided", 0))
+	return {
+		"submitted": submitted,
+		"approved": approved,
+		"rejected": rejected,
+		"pending": submitted - approved - rejected,
+		"allocated": round(float(values.get("allocated", 0)), 2),
+		"approval_rate": round(approved / (approved + rejected), 4) if approved + rejected else None,
+		"decided": decided,
+		"avg_turnaround_hours": round(values.get("turnaround_seconds", 0) / decided / 3600, 2) if decided else None,
+	}
+
+
+def _daily(start: date, end: date, category: Optional[str] = None, department: Optional[str] = None):
+	query = (
+		select(DailyRollup.day, *(func.sum(getattr(DailyRollup, f)) for f in FIELDS))
+		.where(DailyRollup.day >= start, DailyRollup.day <= end)
+		.group_by(DailyRollup.day)
+	)
+	if category is not None:
+		query = query.where(DailyRollup.category == category)
+	if department is not None:
+		query = query.where(DailyRollup.department == department)
+	for day, *sums in db.session.execute(query):
+		yield day, dict(zip(FIELDS, (s or 0 for s in sums)))
+
+
+def series(start: date, end: date, interval: str = "day", category: Optional[str] = None, department: Optional[str] = None) -> list[dict]:
+	# Every period in the range is present, zero-filled, oldest first
+	buckets: dict[str, Counter] = {}
+	day = start
+	while day <= end:
+		buckets.setdefault(_period(day, interval), Counter())
+		day += timedelta(days=1)
+	for day, values in _daily(start, end, category, department):
+		buckets[_period(day, interval)].update(values)
+	return [{"period": period, **_totals(values)} for period, values in buckets.items()]
+
+
+def breakdown(by: str, start: date, end: date) -> list[dict]:
+	groups: dict[str, Counter] = defaultdict(Counter)
+	if by == "year":
+		for day, values in _daily(start, end):
+			groups[str(day.year)].update(values)
+	else:
+		column = getattr(DailyRollup, by)
+		rows = db.session.execute(
+			select(column, *(func.sum(getattr(DailyRollup, f)) for f in FIELDS))
+			.where(DailyRollup.day >= start, DailyRollup.day <= end)
+			.group_by(column)
+		)
+		for key, *sums in rows:
+			groups[key].update(dict(zip(FIELDS, (s or 0 for s in sums))))
+	return [{by: key or None, **_totals(values)} for key, values in sorted(groups.items())]
+
+
+@handler("reports.rebuild")
+def rebuild_job(payloads: list[dict]) -> None:
+	rebuild()
+	db.session.commit()
+
+
+@reports_cli.command("backfill")
+@click.option("--turnaround-from-ledger", is_flag=True, help="Replace measured turnaround with an estimate from ledger approvals (drops rejections).")
+def backfill_command(turnaround_from_ledger: bool):
+	"""Rebuild the daily reporting rollups from the applications table."""
+	count = rebuild(turnaround_from_ledger)
+	db.session.commit()
+	click.echo(f"Rebuilt {count} daily rollup rows")
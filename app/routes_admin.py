@@ -1,10 +1,16 @@
 from datetime import date
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from pathlib import Path
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, Response
 from flask_login import login_required, current_user
-from sqlalchemy import func
-from . import db
+from . import db, stats, ledger, jobs, versions, instrumentation, profiler, reports
 from .models import Scholarship, Application, User, Finance
 from .utils import role_required
+from .database import read_only
+from .pagination import applications_page, page_size
+from .eligibility import missing_applicants_report, eligible_not_applied
+from .exports import EXPORTS, EXPORT_FORMATS, export_response
+from .importer import import_scholarships, queue_student_import, recent_imports, text_stream
+from .decisions import DECISION_STATUSES, apply_decision, decide_many
 
 admin_bp = Blueprint("admin", __name__, template_folder="templates")
 
@@ -12,63 +18,18 @@ admin_bp = Blueprint("admin", __name__, template_folder="templates")
 @admin_bp.get("/dashboard")
 @login_required
 @role_required("admin")
+@read_only
 def dashboard():
-	total_students = db.session.query(User).filter_by(role="student").count()
-	pending = db.session.query(Application).filter_by(status="pending").count()
-	approved = db.session.query(Application).filter_by(status="approved").count()
-	rejected = db.session.query(Application).filter_by(status="rejected").count()
-	total_allocated = db.session.query(func.coalesce(func.sum(Scholarship.amount), 0)).join(Application, Application.scholarship_id == Scholarship.scholarship_id).filter(Application.status == "approved").scalar() or 0
-
-	# charts data
-	by_category = dict(
-		db.session.query(Scholarship.category, func.count(Scholarship.scholarship_id))
-		.group_by(Scholarship.category).all()
-	)
-	by_department = dict(
-		db.session.query(User.department, func.count(Application.application_id))
-		.join(Application, Application.student_id == User.user_id)
-		.filter(User.role == "student")
-		.group_by(User.department)
-		.all()
-	)
-
+	counters = stats.snapshot()
 	fund = db.session.query(Finance).filter_by(year=date.today().year).first()
-
-	# recent lists
-	pending_items = (
-		db.session.query(Application)
-		.filter_by(status="pending")
-		.order_by(Application.submitted_date.desc())
-		.limit(5)
-		.all()
-	)
-	approved_items = (
-		db.session.query(Application)
-		.filter_by(status="approved")
-		.order_by(Application.submitted_date.desc())
-		.limit(5)
-		.all()
-	)
-	rejected_items = (
-		db.session.query(Application)
-		.filter_by(status="rejected")
-		.order_by(Application.submitted_date.desc())
-		.limit(5)
-		.all()
-	)
+	recent = stats.recent_by_status(("pending", "approved", "rejected"))
 	return render_template(
 		"admin/dashboard.html",
-		total_students=total_students,
-		pending=pending,
-		approved=approved,
-		rejected=rejected,
-		total_allocated=total_allocated,
-		by_category=by_category,
-		by_department=by_department,
 		fund=fund,
-		pending_items=pending_items,
-		approved_items=approved_items,
-		rejected_items=rejected_items,
+		pending_items=recent["pending"],
+		approved_items=recent["approved"],
+		rejected_items=recent["rejected"],
+		**counters,
 	)
 
 
@@ -76,15 +37,50 @@ def dashboard():
 @admin_bp.get("/students")
 @login_required
 @role_required("admin")
+@read_only
 def students():
 	items = db.session.query(User).filter_by(role="student").order_by(User.name.asc()).all()
 	return render_template("admin/students.html", items=items)
 
 
+def _run_import(importer, redirect_to: str):
+	upload = request.files.get("csv_file")
+	if not upload or not upload.filename:
+		flash("Choose a CSV file to import", "warning")
+		return redirect(url_for(redirect_to))
+	try:
+		report = importer(text_stream(upload))
+	except ValueError as exc:
+		flash(f"Import failed: {exc}", "danger")
+		return redirect(url_for(redirect_to))
+	flash(
+		f"Imported {report['created']}, skipped {report['skipped']} existing, {report['invalid']} invalid",
+		"success" if not report["invalid"] else "warning",
+	)
+	for error in report["errors"][:10]:
+		flash(error, "warning")
+	return redirect(url_for(redirect_to))
+
+
+@admin_bp.post("/students/import")
+@login_required
+@role_required("admin")
+def students_import():
+	upload = request.files.get("csv_file")
+	if not upload or not upload.filename:
+		flash("Choose a CSV file to import", "warning")
+		return redirect(url_for("admin.students"))
+	queue_student_import(upload)
+	db.session.commit()
+	flash("Import queued; its progress and result are on the Jobs page", "success")
+	return redirect(url_for("admin.jobs_view"))
+
+
 # Scholarships CRUD
 @admin_bp.get("/scholarships")
 @login_required
 @role_required("admin")
+@read_only
 def scholarships_list():
 	items = db.session.query(Scholarship).order_by(Scholarship.end_date.desc()).all()
 	return render_template("admin/scholarships.html", items=items)
@@ -119,17 +115,30 @@ def scholarships_create():
 		income_limit=float(income_limit) if income_limit else None,
 	)
 	db.session.add(item)
+	stats.scholarship_created(item)
+	versions.bump(versions.SCHOLARSHIPS)
 	db.session.commit()
 	flash("Scholarship created", "success")
 	return redirect(url_for("admin.scholarships_list"))
 
 
+@admin_bp.post("/scholarships/import")
+@login_required
+@role_required("admin")
+def scholarships_import():
+	return _run_import(import_scholarships, "admin.scholarships_list")
+
+
 @admin_bp.post("/scholarships/<int:scholarship_id>/delete")
 @login_required
 @role_required("admin")
 def scholarships_delete(scholarship_id: int):
 	item = db.session.get(Scholarship, scholarship_id)
 	if item:
+		stats.scholarship_deleted(item)
+		reports.scholarship_deleted(item)
+		ledger.scholarship_deleted(item, current_user.user_id)
+		versions.bump(versions.SCHOLARSHIPS)
 		db.session.delete(item)
 		db.session.commit()
 		flash("Scholarship deleted", "success")
@@ -140,13 +149,18 @@ def scholarships_delete(scholarship_id: int):
 @admin_bp.get("/applications")
 @login_required
 @role_required("admin")
+@read_only
 def applications():
 	status = request.args.get("status")
-	q = db.session.query(Application)
-	if status in {"pending", "approved", "rejected"}:
-		q = q.filter(Application.status == status)
-	q = q.order_by(Application.submitted_date.desc()).all()
-	return render_template("admin/applications.html", items=q, status=status)
+	cursor = request.args.get("cursor")
+	items, next_cursor = applications_page(status, cursor, page_size(request.args.get("limit")))
+	return render_template(
+		"admin/applications.html",
+		items=items,
+		status=status,
+		cursor=cursor,
+		next_cursor=next_cursor,
+	)
 
 
 @admin_bp.post("/applications/<int:application_id>/decision")
@@ -162,16 +176,10 @@ def application_decision(application_id: int):
 	if status not in {"approved", "rejected"}:
 		flash("Invalid status", "warning")
 		return redirect(url_for("admin.applications"))
-	app.status = status
-	app.remarks = remarks
-	app.reviewed_by = current_user.user_id
-	# Update finance allocated when approved
-	if status == "approved":
-		from .models import Finance
-		fund = db.session.query(Finance).filter_by(year=date.today().year).first()
-		if fund:
-			fund.allocated_amount += float(app.scholarship.amount)
-			fund.recalc()
+	if not apply_decision(app, status, remarks, current_user.user_id):
+		db.session.rollback()
+		flash("Another reviewer decided this application first; check its current status", "warning")
+		return redirect(url_for("admin.applications"))
 	db.session.commit()
 	flash("Decision recorded", "success")
 	# Redirect back to dashboard if the action came from quick actions
@@ -181,10 +189,137 @@ def application_decision(application_id: int):
 	return redirect(url_for("admin.applications"))
 
 
+@admin_bp.post("/applications/batch-decision")
+@login_required
+@role_required("admin")
+def applications_batch_decision():
+	status = request.form.get("status")
+	remarks = request.form.get("remarks") or None
+	ids = request.form.getlist("application_ids")
+	back = url_for("admin.applications", status=request.form.get("filter_status") or None, cursor=request.form.get("cursor") or None)
+	if status not in DECISION_STATUSES:
+		flash("Invalid status", "warning")
+		return redirect(back)
+	if not ids:
+		flash("No applications selected", "warning")
+		return redirect(back)
+	results = decide_many([{"application_id": i, "status": status, "remarks": remarks} for i in ids], current_user.user_id)
+	db.session.commit()
+	done = sum(1 for r in results if r["ok"])
+	failed = len(results) - done
+	flash(f"Decision recorded for {done} application(s)" + (f", {failed} failed" if failed else ""), "success" if not failed else "warning")
+	return redirect(back)
+
+
+# Eligibility report
+@admin_bp.get("/eligibility")
+@login_required
+@role_required("admin")
+@read_only
+def eligibility_report():
+	today = date.today()
+	items = (
+		db.session.query(Scholarship)
+		.filter(Scholarship.start_date <= today, Scholarship.end_date >= today)
+		.order_by(Scholarship.end_date.asc())
+		.all()
+	)
+	report = missing_applicants_report(today)
+	selected = None
+	missing = []
+	sch_id = request.args.get("scholarship_id", type=int)
+	if sch_id:
+		selected = db.session.get(Scholarship, sch_id)
+		if selected:
+			ids = eligible_not_applied(selected)
+			by_id = {u.user_id: u for u in db.session.query(User).filter(User.user_id.in_(ids)).all()} if ids else {}
+			missing = [by_id[i] for i in ids if i in by_id]
+	return render_template("admin/eligibility.html", items=items, report=report, selected=selected, missing=missing)
+
+
+# Streaming exports
+@admin_bp.get("/export/<kind>.<fmt>")
+@login_required
+@role_required("admin")
+@read_only
+def export(kind: str, fmt: str):
+	if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+		abort(404)
+	return export_response(kind, fmt, request.args.get("status"))
+
+
+# Background jobs
+MAINTENANCE_JOBS = {"stats.rebuild", "reports.rebuild", "uploads.gc", "idempotency.purge"}
+
+
+@admin_bp.get("/jobs")
+@login_required
+@role_required("admin")
+@read_only
+def jobs_view():
+	return render_template(
+		"admin/jobs.html",
+		depth=jobs.queue_depth(),
+		failures=jobs.recent_failures(),
+		imports=recent_imports(),
+		maintenance=sorted(MAINTENANCE_JOBS),
+	)
+
+
+@admin_bp.post("/jobs")
+@login_required
+@role_required("admin")
+def jobs_enqueue():
+	kind = request.form.get("kind")
+	if kind not in MAINTENANCE_JOBS:
+		flash("Unknown job", "warning")
+		return redirect(url_for("admin.jobs_view"))
+	jobs.enqueue(kind, priority=200)
+	db.session.commit()
+	flash(f"Queued {kind}", "success")
+	return redirect(url_for("admin.jobs_view"))
+
+
+# Prometheus scrape target (an admin bearer token works for the scraper); counters are per worker process
+@admin_bp.get("/metrics")
+@login_required
+@role_required("admin")
+def metrics():
+	if not current_app.config["INSTRUMENTATION"]:
+		abort(404)
+	return Response(instrumentation.metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Sampled request profiles (see app/profiler.py)
+@admin_bp.get("/profiles")
+@login_required
+@role_required("admin")
+def profiles():
+	return render_template(
+		"admin/profiles.html",
+		routes=profiler.hot_functions(Path(current_app.config["PROFILE_DIR"])),
+		sample_rate=current_app.config["PROFILE_SAMPLE_RATE"],
+		profiled_routes=current_app.config["PROFILE_ROUTES"],
+		header=profiler.HEADER,
+	)
+
+
+@admin_bp.get("/profiles/<route>.folded")
+@login_required
+@role_required("admin")
+def profile_download(route):
+	counts = profiler.merged(Path(current_app.config["PROFILE_DIR"]), route)
+	if not counts:
+		abort(404)
+	body = "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+	return Response(body, mimetype="text/plain", headers={"Content-Disposition": f"attachment; filename={route}.folded"})
+
+
 # Finance management
 @admin_bp.get("/finance")
 @login_required
 @role_required("admin")
+@read_only
 def finance():
 	items = db.session.query(Finance).order_by(Finance.year.desc()).all()
 	return render_template("admin/finance.html", items=items)
@@ -196,13 +331,7 @@ def finance():
 def finance_save():
 	year = int(request.form.get("year"))
 	budget = float(request.form.get("budget_amount") or 0)
-	item = db.session.query(Finance).filter_by(year=year).first()
-	if not item:
-		item = Finance(year=year, budget_amount=budget, allocated_amount=0)
-		db.session.add(item)
-	else:
-		item.budget_amount = budget
-	item.recalc()
+	ledger.set_budget(year, budget)
 	db.session.commit()
 	flash("Finance updated", "success")
 	return redirect(url_for("admin.finance"))
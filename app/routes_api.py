@@ -1,9 +1,16 @@
-from datetime import date
-from flask import Blueprint, jsonify, request
+import hashlib
+import json
+from datetime import date, timedelta
+from flask import Blueprint, Response, jsonify, request
 from flask_login import login_required, current_user
-from . import db
-from .models import User, Scholarship, Application, Finance
-from .utils import check_password
+from . import db, stats, ledger, search, versions, submissions, reports
+from .models import Scholarship, Application
+from .security import authenticate, LoginRejected
+from .tokens import issue_tokens, user_from_refresh_token
+from .pagination import applications_page, scholarships_page, page_size
+from .exports import EXPORTS, EXPORT_FORMATS, export_response
+from .decisions import MAX_BATCH, apply_decision, decide_many
+from .database import read_only
 
 api_bp = Blueprint("api", __name__)
 
@@ -13,28 +20,108 @@ def api_login():
 	data = request.get_json(force=True, silent=True) or {}
 	email = (data.get("email") or "").lower().strip()
 	password = data.get("password") or ""
-	user = db.session.query(User).filter_by(email=email).first()
-	if not user or not check_password(password, user.password_hash):
+	try:
+		user = authenticate(email, password, request.remote_addr)
+	except LoginRejected as exc:
+		status = 429 if exc.reason == "throttled" else 503
+		return jsonify({"ok": False, "error": exc.reason}), status, {"Retry-After": str(exc.retry_after)}
+	if not user:
 		return jsonify({"ok": False, "error": "invalid_credentials"}), 401
-	return jsonify({"ok": True, "user": {"id": user.user_id, "role": user.role, "name": user.name}})
+	return jsonify({"ok": True, "user": {"id": user.user_id, "role": user.role, "name": user.name}, **issue_tokens(user)})
+
+
+@api_bp.post("/token/refresh")
+def api_token_refresh():
+	data = request.get_json(force=True, silent=True) or {}
+	user = user_from_refresh_token(data.get("refresh_token") or "")
+	if not user:
+		return jsonify({"ok": False, "error": "invalid_token"}), 401
+	return jsonify({"ok": True, **issue_tokens(user)})
+
+
+SCHOLARSHIP_FIELDS = ("scholarship_id", "name", "category", "eligibility", "amount", "start_date", "end_date", "min_cgpa", "income_limit")
+
+
+def _scholarship_json(s: Scholarship, fields) -> dict:
+	out = {}
+	for f in fields:
+		value = getattr(s, f)
+		out[f] = value.isoformat() if isinstance(value, date) else value
+	return out
+
+
+def _scholarship_filters(args) -> dict:
+	# Raises ValueError on malformed input
+	filters = {}
+	if args.get("category"):
+		filters["category"] = [c.strip() for c in args["category"].split(",") if c.strip()]
+	if args.get("active_on"):
+		filters["active_on"] = date.fromisoformat(args["active_on"])
+	elif args.get("active") == "1":
+		filters["active_on"] = date.today()
+	for key in ("min_amount", "max_amount"):
+		if args.get(key):
+			filters[key] = float(args[key])
+	return filters
 
 
 @api_bp.get("/scholarships")
 @login_required
+@read_only
 def api_scholarships():
-	items = db.session.query(Scholarship).all()
-	return jsonify([
-		{
-			"scholarship_id": s.scholarship_id,
-			"name": s.name,
-			"category": s.category,
-			"eligibility": s.eligibility,
-			"amount": s.amount,
-			"start_date": s.start_date.isoformat(),
-			"end_date": s.end_date.isoformat(),
-		}
-		for s in items
-	])
+	fields = SCHOLARSHIP_FIELDS
+	if request.args.get("fields"):
+		wanted = {f.strip() for f in request.args["fields"].split(",") if f.strip()}
+		if wanted - set(SCHOLARSHIP_FIELDS):
+			return jsonify({"ok": False, "error": "unknown_fields", "fields": sorted(wanted - set(SCHOLARSHIP_FIELDS))}), 400
+		fields = tuple(f for f in SCHOLARSHIP_FIELDS if f in wanted or f == "scholarship_id")
+	try:
+		filters = _scholarship_filters(request.args)
+	except ValueError:
+		return jsonify({"ok": False, "error": "invalid_filter"}), 400
+	# The body is a pure function of the catalogue version, the query string and (for ?active=1) the date,
+	# so the ETag can be answered before touching the catalogue and the body can be reused across clients
+	key = (versions.current(versions.SCHOLARSHIPS), date.today().isoformat(), tuple(sorted(request.args.items(multi=True))))
+	etag = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+	if request.if_none_match.contains(etag):
+		rv = Response(status=304)
+	else:
+		body = versions.response_cache.get(key)
+		if body is None:
+			q = (request.args.get("q") or "").strip()
+			payload = _search_scholarships(q, fields) if q else _list_scholarships(filters, fields)
+			body = json.dumps(payload, separators=(",", ":"))
+			versions.response_cache.set(key, body)
+		rv = Response(body, mimetype="application/json")
+	rv.set_etag(etag)
+	rv.cache_control.private = True
+	rv.cache_control.no_cache = True
+	return rv
+
+
+def _list_scholarships(filters: dict, fields) -> dict:
+	items, next_cursor = scholarships_page(filters, request.args.get("cursor"), page_size(request.args.get("limit")))
+	return {"items": [_scholarship_json(s, fields) for s in items], "next_cursor": next_cursor}
+
+
+def _search_scholarships(q: str, fields) -> dict:
+	limit = page_size(request.args.get("limit"))
+	page = max(request.args.get("page", 1, type=int), 1)
+	active_on = date.today() if request.args.get("active") == "1" else None
+	results, total = search.search(q, active_on=active_on, limit=limit, offset=(page - 1) * limit)
+	return {
+		"items": [
+			{
+				**_scholarship_json(r["scholarship"], fields),
+				"rank": r["rank"],
+				"highlight": {"name": str(r["name_html"]), "eligibility": str(r["eligibility_html"])},
+			}
+			for r in results
+		],
+		"total": total,
+		"page": page,
+		"next_page": page + 1 if page * limit < total else None,
+	}
 
 
 @api_bp.post("/scholarships")
@@ -69,6 +156,8 @@ def api_create_scholarship():
 		income_limit=float(income_limit) if income_limit is not None else None,
 	)
 	db.session.add(sch)
+	stats.scholarship_created(sch)
+	versions.bump(versions.SCHOLARSHIPS)
 	db.session.commit()
 	return jsonify({"ok": True, "scholarship_id": sch.scholarship_id})
 
@@ -80,15 +169,56 @@ def api_apply():
 	sch_id = int(data.get("scholarship_id"))
 	cgpa_value = float(data.get("cgpa")) if data.get("cgpa") is not None else None
 
-	# duplicate check
-	exists = db.session.query(Application).filter_by(student_id=current_user.user_id, scholarship_id=sch_id).first()
-	if exists:
-		return jsonify({"ok": False, "error": "duplicate"}), 400
+	# Clients may send Idempotency-Key; a retry gets the original response back without a second insert
+	key = submissions.request_key()
+	fp = submissions.fingerprint(sch_id, cgpa_value)
+	if key:
+		try:
+			stored = submissions.replay(current_user.user_id, key, fp)
+		except submissions.KeyReused:
+			return jsonify({"ok": False, "error": "idempotency_key_reused"}), 422
+		if stored:
+			return jsonify(stored[1]), stored[0], {"Idempotent-Replayed": "true"}
 
-	app = Application(student_id=current_user.user_id, scholarship_id=sch_id, cgpa_value=cgpa_value)
-	db.session.add(app)
+	app_id = submissions.submit(current_user, sch_id, cgpa_value)
+	if app_id is None:
+		return jsonify({"ok": False, "error": "duplicate"}), 400
+	body = {"ok": True, "application_id": app_id}
+	if key and not submissions.remember(current_user.user_id, key, fp, 200, body):
+		db.session.rollback()
+		status, body = submissions.replay(current_user.user_id, key, fp)
+		return jsonify(body), status, {"Idempotent-Replayed": "true"}
 	db.session.commit()
-	return jsonify({"ok": True, "application_id": app.application_id})
+	return jsonify(body)
+
+
+@api_bp.get("/applications")
+@login_required
+@read_only
+def api_applications():
+	if current_user.role != "admin":
+		return jsonify({"ok": False, "error": "forbidden"}), 403
+	items, next_cursor = applications_page(
+		request.args.get("status"),
+		request.args.get("cursor"),
+		page_size(request.args.get("limit")),
+	)
+	return jsonify({
+		"items": [
+			{
+				"application_id": a.application_id,
+				"status": a.status,
+				"submitted_date": a.submitted_date.isoformat(),
+				"student": {"id": a.student.user_id, "name": a.student.name, "department": a.student.department},
+				"scholarship": {"id": a.scholarship.scholarship_id, "name": a.scholarship.name},
+				"reviewed_by": a.reviewer.name if a.reviewer else None,
+				"remarks": a.remarks,
+				"cgpa": a.cgpa_value,
+			}
+			for a in items
+		],
+		"next_cursor": next_cursor,
+	})
 
 
 @api_bp.post("/approve")
@@ -105,23 +235,128 @@ def api_approve():
 		return jsonify({"ok": False, "error": "not_found"}), 404
 	if status not in {"approved", "rejected"}:
 		return jsonify({"ok": False, "error": "invalid_status"}), 400
-	app.status = status
-	app.remarks = remarks
-	app.reviewed_by = current_user.user_id
-	if status == "approved":
-		fund = db.session.query(Finance).filter_by(year=date.today().year).first()
-		if fund:
-			fund.allocated_amount += float(app.scholarship.amount)
-			fund.recalc()
+	if not apply_decision(app, status, remarks, current_user.user_id):
+		db.session.rollback()
+		return jsonify({"ok": False, "error": "conflict"}), 409
 	db.session.commit()
 	return jsonify({"ok": True})
 
 
+@api_bp.post("/approve/batch")
+@login_required
+def api_approve_batch():
+	if current_user.role != "admin":
+		return jsonify({"ok": False, "error": "forbidden"}), 403
+	data = request.get_json(force=True, silent=True) or {}
+	decisions = data.get("decisions")
+	if decisions is None and isinstance(data.get("application_ids"), list):
+		# Shorthand: one status and remarks for every listed id
+		decisions = [
+			{"application_id": i, "status": data.get("status"), "remarks": data.get("remarks")}
+			for i in data["application_ids"]
+		]
+	if not isinstance(decisions, list) or not decisions:
+		return jsonify({"ok": False, "error": "missing_or_invalid_fields"}), 400
+	if len(decisions) > MAX_BATCH:
+		return jsonify({"ok": False, "error": "batch_too_large", "max": MAX_BATCH}), 413
+	results = decide_many(decisions, current_user.user_id)
+	db.session.commit()
+	updated = sum(1 for r in results if r["ok"])
+	return jsonify({"ok": updated == len(results), "updated": updated, "failed": len(results) - updated, "results": results})
+
+
+@api_bp.get("/export/<kind>")
+@login_required
+@read_only
+def api_export(kind: str):
+	if current_user.role != "admin":
+		return jsonify({"ok": False, "error": "forbidden"}), 403
+	fmt = request.args.get("format", "ndjson")
+	if kind not in EXPORTS:
+		return jsonify({"ok": False, "error": "not_found"}), 404
+	if fmt not in EXPORT_FORMATS:
+		return jsonify({"ok": False, "error": "invalid_format"}), 400
+	return export_response(kind, fmt, request.args.get("status"))
+
+
 @api_bp.get("/fund-report/year")
 @login_required
+@read_only
 def api_fund_report_year():
 	year = int(request.args.get("year", date.today().year))
-	fund = db.session.query(Finance).filter_by(year=year).first()
-	if not fund:
-		return jsonify({"year": year, "budget": 0, "allocated": 0, "balance": 0})
-	return jsonify({"year": year, "budget": fund.budget_amount, "allocated": fund.allocated_amount, "balance": fund.balance_amount})
+	return jsonify(ledger.fund_report(year))
+
+
+def _report_range() -> tuple[date, date]:
+	# ?from=&to= as ISO dates; defaults to the last 90 days
+	end = date.fromisoformat(request.args["to"]) if request.args.get("to") else date.today()
+	start = date.fromisoformat(request.args["from"]) if request.args.get("from") else end - timedelta(days=89)
+	if start > end or (end - start).days >= reports.MAX_DAYS:
+		raise ValueError("range")
+	return start, end
+
+
+@api_bp.get("/reports/applications")
+@login_required
+@read_only
+def api_report_applications():
+	if current_user.role != "admin":
+		return jsonify({"ok": False, "error": "forbidden"}), 403
+	interval = request.args.get("interval", "day")
+	if interval not in reports.INTERVALS:
+		return jsonify({"ok": False, "error": "invalid_interval"}), 400
+	try:
+		start, end = _report_range()
+	except ValueError:
+		return jsonify({"ok": False, "error": "invalid_range"}), 400
+	category = request.args.get("category")
+	department = request.args.get("department")
+	return jsonify({
+		"from": start.isoformat(),
+		"to": end.isoformat(),
+		"interval": interval,
+		"category": category,
+		"department": department,
+		"series": reports.series(start, end, interval, category, department),
+	})
+
+
+@api_bp.get("/reports/turnaround")
+@login_required
+@read_only
+def api_report_turnaround():
+	if current_user.role != "admin":
+		return jsonify({"ok": False, "error": "forbidden"}), 403
+	interval = request.args.get("interval", "week")
+	if interval not in reports.INTERVALS:
+		return jsonify({"ok": False, "error": "invalid_interval"}), 400
+	try:
+		start, end = _report_range()
+	except ValueError:
+		return jsonify({"ok": False, "error": "invalid_range"}), 400
+	# By submission period: how long applications submitted then waited for their first decision
+	return jsonify({
+		"from": start.isoformat(),
+		"to": end.isoformat(),
+		"interval": interval,
+		"series": [
+			{"period": p["period"], "decided": p["decided"], "pending": p["pending"], "avg_turnaround_hours": p["avg_turnaround_hours"]}
+			for p in reports.series(start, end, interval, request.args.get("category"), request.args.get("department"))
+		],
+	})
+
+
+@api_bp.get("/reports/breakdown")
+@login_required
+@read_only
+def api_report_breakdown():
+	if current_user.role != "admin":
+		return jsonify({"ok": False, "error": "forbidden"}), 403
+	by = request.args.get("by", "category")
+	if by not in reports.BREAKDOWNS:
+		return jsonify({"ok": False, "error": "invalid_breakdown"}), 400
+	try:
+		start, end = _report_range()
+	except ValueError:
+		return jsonify({"ok": False, "error": "invalid_range"}), 400
+	return jsonify({"from": start.isoformat(), "to": end.isoformat(), "by": by, "items": reports.breakdown(by, start, end)})
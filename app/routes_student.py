@@ -1,20 +1,27 @@
 from datetime import date
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, get_template_attribute, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from sqlalchemy import func
-from . import db
-from .models import Scholarship, Application
-from .utils import role_required, save_uploaded
+from sqlalchemy.orm import joinedload
+from . import db, stats, search, versions, fragments, submissions
+from .models import Scholarship, Application, User
+from .utils import role_required
+from .database import read_only
+from .storage import save_uploaded
+from .eligibility import eligible_ids
 
 student_bp = Blueprint("student", __name__, template_folder="templates")
 
+SEARCH_PAGE_SIZE = 20
+
 
 @student_bp.get("/dashboard")
 @login_required
 @role_required("student")
+@read_only
 def dashboard():
 	apps = (
 		db.session.query(Application)
+		.options(joinedload(Application.scholarship))
 		.filter(Application.student_id == current_user.user_id)
 		.order_by(Application.submitted_date.desc())
 		.all()
@@ -22,42 +29,92 @@ def dashboard():
 	return render_template("student/dashboard.html", applications=apps)
 
 
+def _active_scholarships(today: date) -> list[Scholarship]:
+	return (
+		db.session.query(Scholarship)
+		.filter(Scholarship.start_date <= today, Scholarship.end_date >= today)
+		.order_by(Scholarship.end_date.asc(), Scholarship.scholarship_id.asc())
+		.all()
+	)
+
+
 @student_bp.get("/scholarships")
 @login_required
 @role_required("student")
+@read_only
 def scholarships():
 	today = date.today()
-	items = (
-		db.session.query(Scholarship)
-		.filter(Scholarship.start_date <= today, Scholarship.end_date >= today)
-		.order_by(Scholarship.end_date.asc())
+	q = (request.args.get("q") or "").strip()
+	page = max(request.args.get("page", 1, type=int), 1)
+	eligible_only = request.args.get("eligible") == "1"
+	total = 0
+	if not q and not eligible_only:
+		# The plain list is the same for every student on a given day: render it once per catalogue version
+		cards = fragments.cached(
+			"student.scholarships",
+			(versions.current(versions.SCHOLARSHIPS), today.isoformat()),
+			lambda: render_template("student/_scholarship_cards.html", items=_active_scholarships(today), hits={}, q="", eligible_only=False),
+		)
+	else:
+		hits = {}
+		if q:
+			results, total = search.search(q, active_on=today, limit=SEARCH_PAGE_SIZE, offset=(page - 1) * SEARCH_PAGE_SIZE)
+			items = [r["scholarship"] for r in results]
+			hits = {r["scholarship"].scholarship_id: r for r in results}
+		else:
+			items = _active_scholarships(today)
+		if eligible_only:
+			ok = eligible_ids(current_user, items)
+			items = [s for s in items if s.scholarship_id in ok]
+		cards = render_template("student/_scholarship_cards.html", items=items, hits=hits, q=q, eligible_only=eligible_only)
+	# Per-student parts (applied badge or the apply form) go into the slots left in the shared markup
+	applied = dict(
+		db.session.query(Application.scholarship_id, Application.status)
+		.filter(Application.student_id == current_user.user_id)
 		.all()
 	)
-	return render_template("student/scholarships.html", items=items)
+	apply_slot = get_template_attribute("student/_apply_slot.html", "apply_slot")
+	return render_template(
+		"student/scholarships.html",
+		cards=fragments.fill_slots(cards, lambda sid: apply_slot(sid, applied.get(sid))),
+		eligible_only=eligible_only,
+		q=q,
+		page=page,
+		has_next=page * SEARCH_PAGE_SIZE < total,
+		total=total,
+	)
+
+
+def _submission_redirect(response: dict):
+	flash(*response["flash"])
+	return redirect(response["location"])
 
 
 @student_bp.post("/apply/<int:scholarship_id>")
 @login_required
 @role_required("student")
 def apply(scholarship_id: int):
+	# A retried form post (same hidden key) gets the first outcome back before any file is stored
+	key = submissions.request_key()
+	fp = submissions.fingerprint(scholarship_id, request.form.get("cgpa"))
+	if key:
+		try:
+			stored = submissions.replay(current_user.user_id, key, fp)
+		except submissions.KeyReused:
+			flash("This form was already used for a different submission. Please try again.", "warning")
+			return redirect(url_for("student.scholarships"))
+		if stored:
+			return _submission_redirect(stored[1])
+
 	sch = db.session.get(Scholarship, scholarship_id)
 	if not sch:
 		flash("Scholarship not found", "danger")
 		return redirect(url_for("student.scholarships"))
-	# Prevent duplicate
-	existing = (
-		db.session.query(Application)
-		.filter_by(student_id=current_user.user_id, scholarship_id=scholarship_id)
-		.first()
-	)
-	if existing:
-		flash("You have already applied.", "warning")
-		return redirect(url_for("student.scholarships"))
 
 	cgpa_value = float(request.form.get("cgpa")) if request.form.get("cgpa") else None
-	income_path = save_uploaded(request.files.get("income_proof"), f"user_{current_user.user_id}") if request.files else ""
-	govt_id_path = save_uploaded(request.files.get("govt_id"), f"user_{current_user.user_id}") if request.files else ""
-
+	if cgpa_value is not None and not 0 <= cgpa_value <= 10:
+		flash("CGPA must be between 0 and 10.", "danger")
+		return redirect(url_for("student.scholarships"))
 	# Basic validation against scholarship thresholds
 	if sch.min_cgpa is not None and (cgpa_value or 0) < sch.min_cgpa:
 		flash("CGPA below required minimum.", "danger")
@@ -68,17 +125,18 @@ def apply(scholarship_id: int):
 			flash("Family income exceeds limit.", "danger")
 			return redirect(url_for("student.scholarships"))
 
-	app = Application(
-		student_id=current_user.user_id,
-		scholarship_id=scholarship_id,
-		cgpa_value=cgpa_value,
-		income_proof_path=income_path,
-		govt_id_path=govt_id_path,
-	)
-	db.session.add(app)
+	income_path = save_uploaded(request.files.get("income_proof")) if request.files else ""
+	govt_id_path = save_uploaded(request.files.get("govt_id")) if request.files else ""
+	# The unique index is the duplicate check; blobs stored for a rejected duplicate are left to uploads gc
+	if submissions.submit(current_user, scholarship_id, cgpa_value, income_path, govt_id_path) is None:
+		flash("You have already applied.", "warning")
+		return redirect(url_for("student.scholarships"))
+	response = {"location": url_for("student.dashboard"), "flash": ["Application submitted.", "success"]}
+	if key and not submissions.remember(current_user.user_id, key, fp, 302, response):
+		db.session.rollback()
+		return _submission_redirect(submissions.replay(current_user.user_id, key, fp)[1])
 	db.session.commit()
-	flash("Application submitted.", "success")
-	return redirect(url_for("student.dashboard"))
+	return _submission_redirect(response)
 
 
 @student_bp.get("/profile")
@@ -92,12 +150,16 @@ def profile():
 @login_required
 @role_required("student")
 def profile_post():
-	current_user.name = request.form.get("name", current_user.name)
-	current_user.department = request.form.get("department")
+	# current_user may come from another worker's stale cache; the counters move from the department on file
+	user = db.session.get(User, current_user.user_id, populate_existing=True, with_for_update=True)
+	user.name = request.form.get("name", user.name)
+	department = request.form.get("department")
+	stats.department_changed(user, user.department, department)
+	user.department = department
 	cgpa = request.form.get("cgpa")
 	income = request.form.get("family_income")
-	current_user.cgpa = float(cgpa) if cgpa else current_user.cgpa
-	current_user.family_income = float(income) if income else current_user.family_income
+	user.cgpa = float(cgpa) if cgpa else user.cgpa
+	user.family_income = float(income) if income else user.family_income
 	db.session.commit()
 	flash("Profile updated", "success")
 	return redirect(url_for("student.profile"))
@@ -0,0 +1,233 @@
+import math
+import re
+import threading
+from collections import defaultdict
+from datetime import date
+from typing import Optional
+import click
+from flask.cli import AppGroup
+from markupsafe import Markup, escape
+from sqlalchemy import event, func, select, text
+from . import db
+from .models import Scholarship
+
+FTS_TABLE = "scholarships_fts"
+# name, category, eligibility: a hit in the name matters most
+FIELD_WEIGHTS = (10.0, 3.0, 1.0)
+HL_OPEN, HL_CLOSE = "\x02", "\x03"
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+search_cli = AppGroup("search", help="Scholarship full-text index.")
+
+_fts_tables: set[str] = set()
+
+
+def _tokens(value: str) -> list[str]:
+	return [t.lower() for t in TOKEN_RE.findall(value or "")]
+
+
+def _mark(value: str) -> Markup:
+	# Highlight markers survive escaping as control characters, then become <mark> tags
+	return Markup(str(escape(value or "")).replace(HL_OPEN, "<mark>").replace(HL_CLOSE, "</mark>"))
+
+
+def _fts5_compiled(connection) -> bool:
+	return connection.dialect.name == "sqlite" and bool(
+		connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar()
+	)
+
+
+def create_fts(connection) -> bool:
+	# Created with the schema (and by `search rebuild`), never from inside a request's transaction.
+	# Triggers keep it in step with every write path: ORM, bulk import, seed script or raw SQL.
+	if not _fts5_compiled(connection):
+		return False
+	connection.exec_driver_sql(
+		f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, category, eligibility, tokenize = 'unicode61 remove_diacritics 2')"
+	)
+	connection.exec_driver_sql(
+		f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON scholarships BEGIN "
+		f"INSERT INTO {FTS_TABLE} (rowid, name, category, eligibility) VALUES (new.scholarship_id, new.name, new.category, new.eligibility); END"
+	)
+	connection.exec_driver_sql(
+		f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON scholarships BEGIN "
+		f"DELETE FROM {FTS_TABLE} WHERE rowid = old.scholarship_id; END"
+	)
+	connection.exec_driver_sql(
+		f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, category, eligibility ON scholarships BEGIN "
+		f"UPDATE {FTS_TABLE} SET name = new.name, category = new.category, eligibility = new.eligibility WHERE rowid = old.scholarship_id; END"
+	)
+	return True
+
+
+@event.listens_for(Scholarship.__table__, "after_create")
+def _create_fts_with_schema(target, connection, **kw):
+	if create_fts(connection):
+		_fts_fill(connection)
+
+
+def _fts_fill(connection) -> int:
+	connection.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+	connection.exec_driver_sql(
+		f"INSERT INTO {FTS_TABLE} (rowid, name, category, eligibility) "
+		"SELECT scholarship_id, name, category, eligibility FROM scholarships"
+	)
+	return connection.exec_driver_sql(f"SELECT count(*) FROM {FTS_TABLE}").scalar() or 0
+
+
+def fts_available() -> bool:
+	engine = db.session.get_bind()
+	if engine.dialect.name != "sqlite":
+		return False
+	key = str(engine.url)
+	if key in _fts_tables:
+		return True
+	# Only a positive answer is remembered, so a later `search rebuild` is picked up without a restart
+	exists = db.session.execute(
+		text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+	).first()
+	if exists:
+		_fts_tables.add(key)
+	return bool(exists)
+
+
+class InvertedIndex:
+	# Fallback for databases without FTS5: per-worker postings rebuilt whenever the catalogue signature moves
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._signature = None
+		self._postings: dict[str, dict[int, float]] = {}
+		self._docs: dict[int, tuple[str, str, str]] = {}
+
+	def _signature_now(self):
+		return tuple(db.session.execute(
+			select(func.count(Scholarship.scholarship_id), func.max(Scholarship.scholarship_id), func.sum(Scholarship.scholarship_id))
+		).one())
+
+	def _build(self) -> None:
+		postings: dict[str, dict[int, float]] = defaultdict(lambda: defaultdict(float))
+		docs = {}
+		rows = db.session.execute(
+			select(Scholarship.scholarship_id, Scholarship.name, Scholarship.category, Scholarship.eligibility)
+		)
+		for sch_id, *values in rows:
+			docs[sch_id] = tuple(values)
+			for weight, value in zip(FIELD_WEIGHTS, values):
+				for token in _tokens(value):
+					postings[token][sch_id] += weight
+		self._postings = {t: dict(p) for t, p in postings.items()}
+		self._docs = docs
+
+	def ensure_fresh(self) -> None:
+		signature = self._signature_now()
+		with self._lock:
+			if signature != self._signature:
+				self._build()
+				self._signature = signature
+
+	def invalidate(self) -> None:
+		with self._lock:
+			self._signature = None
+
+	def search(self, terms: list[str]) -> list[tuple[int, float]]:
+		# Every term must match (as a prefix); score is field-weighted tf * idf
+		n_docs = max(len(self._docs), 1)
+		scores: Optional[dict[int, float]] = None
+		for term in terms:
+			matched: dict[int, float] = defaultdict(float)
+			for token, posting in self._postings.items():
+				if token.startswith(term):
+					idf = math.log(1 + n_docs / len(posting))
+					for sch_id, tf in posting.items():
+						matched[sch_id] += tf * idf
+			if scores is None:
+				scores = dict(matched)
+			else:
+				scores = {k: v + matched[k] for k, v in scores.items() if k in matched}
+			if not scores:
+				return []
+		return sorted((scores or {}).items(), key=lambda kv: (-kv[1], kv[0]))
+
+	def highlight(self, sch_id: int, terms: list[str]) -> tuple[str, str]:
+		name, _category, eligibility = self._docs.get(sch_id, ("", "", ""))
+		pattern = re.compile(r"\b(" + "|".join(re.escape(t) for t in terms) + r")\w*", re.IGNORECASE | re.UNICODE)
+		wrap = lambda m: HL_OPEN + m.group(0) + HL_CLOSE  # noqa: E731
+		return pattern.sub(wrap, name), pattern.sub(wrap, eligibility)
+
+
+inverted_index = InvertedIndex()
+
+
+def _fts_query(terms: list[str]) -> str:
+	# Each word as a quoted prefix term, so user input can't inject FTS5 syntax
+	return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+
+def search(q: str, active_on: Optional[date] = None, limit: int = 20, offset: int = 0) -> tuple[list[dict], int]:
+	terms = _tokens(q)
+	if not terms:
+		return [], 0
+	if fts_available():
+		hits, total = _search_fts(terms, active_on, limit, offset)
+	else:
+		hits, total = _search_fallback(terms, active_on, limit, offset)
+	if not hits:
+		return [], total
+	by_id = {s.scholarship_id: s for s in db.session.query(Scholarship).filter(Scholarship.scholarship_id.in_([h["id"] for h in hits]))}
+	results = []
+	for hit in hits:
+		sch = by_id.get(hit["id"])
+		if sch is not None:
+			results.append({
+				"scholarship": sch,
+				"rank": hit["rank"],
+				"name_html": _mark(hit["name"]),
+				"eligibility_html": _mark(hit["eligibility"]),
+			})
+	return results, total
+
+
+def _search_fts(terms, active_on, limit, offset):
+	where = f"{FTS_TABLE} MATCH :q"
+	params = {"q": _fts_query(terms), "limit": limit, "offset": offset, "wn": FIELD_WEIGHTS[0], "wc": FIELD_WEIGHTS[1], "we": FIELD_WEIGHTS[2]}
+	join = ""
+	if active_on:
+		join = f" JOIN scholarships s ON s.scholarship_id = {FTS_TABLE}.rowid"
+		where += " AND s.start_date <= :on AND s.end_date >= :on"
+		params["on"] = active_on.isoformat()
+	total = db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}{join} WHERE {where}"), params).scalar() or 0
+	rows = db.session.execute(text(
+		f"SELECT {FTS_TABLE}.rowid, bm25({FTS_TABLE}, :wn, :wc, :we) AS rank, "
+		f"highlight({FTS_TABLE}, 0, char(2), char(3)), "
+		f"snippet({FTS_TABLE}, 2, char(2), char(3), '…', 32) "
+		f"FROM {FTS_TABLE}{join} WHERE {where} ORDER BY rank, {FTS_TABLE}.rowid LIMIT :limit OFFSET :offset"
+	), params).all()
+	return [{"id": r[0], "rank": -float(r[1]), "name": r[2], "eligibility": r[3]} for r in rows], total
+
+
+def _search_fallback(terms, active_on, limit, offset):
+	inverted_index.ensure_fresh()
+	ranked = inverted_index.search(terms)
+	if active_on and ranked:
+		active = set(db.session.execute(
+			select(Scholarship.scholarship_id).where(Scholarship.start_date <= active_on, Scholarship.end_date >= active_on)
+		).scalars())
+		ranked = [r for r in ranked if r[0] in active]
+	hits = []
+	for sch_id, score in ranked[offset:offset + limit]:
+		name, eligibility = inverted_index.highlight(sch_id, terms)
+		hits.append({"id": sch_id, "rank": score, "name": name, "eligibility": eligibility})
+	return hits, len(ranked)
+
+
+@search_cli.command("rebuild")
+def rebuild_command():
+	"""Create (if needed) and repopulate the scholarship search index."""
+	connection = db.session.connection()
+	if create_fts(connection):
+		count = _fts_fill(connection)
+		db.session.commit()
+		click.echo(f"Indexed {count} scholarships (FTS5)")
+	else:
+		inverted_index.invalidate()
+		click.echo("FTS5 unavailable; searches use the in-process index, which rebuilds itself")
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+from flask import current_app
+from sqlalchemy import delete, func, select
+from . import db
+from .models import LoginFailure, User
+from .sqlutil import upsert_increment
+from .utils import check_password, hash_password, hash_rounds
+
+
+class LoginRejected(Exception):
+	def __init__(self, reason: str, retry_after: int = 0):
+		super().__init__(reason)
+		self.reason = reason
+		self.retry_after = retry_after
+
+
+class PasswordPool:
+	# bcrypt releases the GIL, so a small thread pool hashes in parallel while the semaphore caps how much
+	# work may queue; beyond that callers are turned away instead of piling up. This only protects the
+	# process's other request threads, hence the gthread workers in gunicorn.conf.py.
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._executor: Optional[ThreadPoolExecutor] = None
+		self._slots: Optional[threading.BoundedSemaphore] = None
+		self._pid = None
+
+	def _ensure(self) -> None:
+		# Re-created after fork: executor threads don't survive into gunicorn workers
+		if self._executor is not None and self._pid == os.getpid():
+			return
+		with self._lock:
+			if self._executor is not None and self._pid == os.getpid():
+				return
+			size = current_app.config["BCRYPT_POOL_SIZE"]
+			self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="bcrypt")
+			self._slots = threading.BoundedSemaphore(size + current_app.config["BCRYPT_QUEUE_DEPTH"])
+			self._pid = os.getpid()
+
+	def run(self, fn, *args):
+		self._ensure()
+		if not self._slots.acquire(timeout=current_app.config["BCRYPT_QUEUE_WAIT"]):
+			raise LoginRejected("busy", retry_after=1)
+		slots = self._slots
+		try:
+			future = self._executor.submit(fn, *args)
+		except BaseException:
+			slots.release()
+			raise
+		# The slot is held until the hash itself finishes, even if this request stops waiting for it
+		future.add_done_callback(lambda _: slots.release())
+		try:
+			return future.result(timeout=current_app.config["BCRYPT_TIMEOUT"])
+		except FutureTimeout:
+			raise LoginRejected("busy", retry_after=1)
+
+
+class LoginThrottle:
+	# Failures counted in the database so every worker and host enforces the same limits. The window is
+	# tracked in BUCKETS slices; a slice drops out once it is entirely older than the window.
+	BUCKETS = 30
+
+	def _bucket_seconds(self, window: int) -> int:
+		return max(1, window // self.BUCKETS)
+
+	def retry_after(self, limits: dict[str, int], window: int) -> int:
+		now = time.time()
+		size = self._bucket_seconds(window)
+		rows = db.session.execute(
+			select(LoginFailure.key, func.sum(LoginFailure.failures), func.min(LoginFailure.bucket))
+			.where(LoginFailure.key.in_(list(limits)), LoginFailure.bucket >= int((now - window) // size))
+			.group_by(LoginFailure.key)
+		)
+		for key, failures, oldest in rows:
+			if failures >= limits[key]:
+				return min(window, max(1, int((oldest + 1) * size + window - now)))
+		return 0
+
+	def record_failure(self, keys, window: int) -> None:
+		now = time.time()
+		size = self._bucket_seconds(window)
+		bucket = int(now // size)
+		upsert_increment(LoginFailure.__table__, [{"key": k, "bucket": bucket, "failures": 1} for k in keys], ("key", "bucket"), ("failures",))
+		db.session.execute(delete(LoginFailure).where(LoginFailure.bucket < int((now - window) // size)))
+		db.session.commit()
+
+	def reset(self, key: str) -> None:
+		db.session.execute(delete(LoginFailure).where(LoginFailure.key == key))
+		db.session.commit()
+
+
+password_pool = PasswordPool()
+login_throttle = LoginThrottle()
+
+
+def authenticate(email: str, password: str, ip: Optional[str]) -> Optional[User]:
+	# Throttle check comes first so brute-force traffic never reaches bcrypt
+	cfg = current_app.config
+	window = cfg["LOGIN_THROTTLE_WINDOW"]
+	email_key, ip_key = f"email:{email}", f"ip:{ip}"
+	wait = login_throttle.retry_after(
+		{email_key: cfg["LOGIN_MAX_FAILURES_PER_EMAIL"], ip_key: cfg["LOGIN_MAX_FAILURES_PER_IP"]},
+		window,
+	)
+	if wait:
+		raise LoginRejected("throttled", retry_after=wait)
+	user = db.session.query(User).filter_by(email=email).first()
+	if not user or not password_pool.run(check_password, password, user.password_hash):
+		login_throttle.record_failure((email_key, ip_key), window)
+		return None
+	login_throttle.reset(email_key)
+	rounds = cfg["BCRYPT_ROUNDS"]
+	if hash_rounds(user.password_hash) != rounds:
+		# Cost factor changed since this hash was made: upgrade it while we hold the plaintext
+		try:
+			user.password_hash = password_pool.run(hash_password, password, rounds)
+			db.session.commit()
+		except LoginRejected:
+			pass  # try again on a quieter login
+	return user
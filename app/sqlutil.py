@@ -0,0 +1,73 @@
+from typing import Optional
+from sqlalchemy import Row, insert
+from sqlalchemy.exc import IntegrityError
+from . import db
+
+
+def upsert_increment(table, rows: list[dict], key_cols: tuple[str, ...], inc_cols: tuple[str, ...]) -> None:
+	# INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col, so concurrent writers never lose updates
+	if not rows:
+		return
+	dialect = db.session.get_bind().dialect.name
+	if dialect == "sqlite":
+		from sqlalchemy.dialects.sqlite import insert as dialect_insert
+	elif dialect == "postgresql":
+		from sqlalchemy.dialects.postgresql import insert as dialect_insert
+	elif dialect == "mysql":
+		from sqlalchemy.dialects.mysql import insert as mysql_insert
+		stmt = mysql_insert(table)
+		stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in inc_cols})
+		db.session.execute(stmt, rows)
+		return
+	else:
+		_update_then_insert(table, rows, key_cols, inc_cols)
+		return
+	stmt = dialect_insert(table)
+	stmt = stmt.on_conflict_do_update(
+		index_elements=list(key_cols),
+		set_={c: table.c[c] + stmt.excluded[c] for c in inc_cols},
+	)
+	db.session.execute(stmt, rows)
+
+
+def insert_or_ignore(table, values: dict, key_cols: tuple[str, ...]) -> Optional[Row]:
+	# One statement whose outcome the unique index decides: the new row's primary key, or None if it already existed
+	dialect = db.session.get_bind().dialect.name
+	if dialect in ("sqlite", "postgresql"):
+		if dialect == "sqlite":
+			from sqlalchemy.dialects.sqlite import insert as dialect_insert
+		else:
+			from sqlalchemy.dialects.postgresql import insert as dialect_insert
+		stmt = (
+			dialect_insert(table)
+			.values(**values)
+			.on_conflict_do_nothing(index_elements=list(key_cols))
+			.returning(*table.primary_key.columns)
+		)
+		return db.session.execute(stmt).first()
+	if dialect == "mysql":
+		res = db.session.execute(insert(table).prefix_with("IGNORE").values(**values))
+		return res.inserted_primary_key if res.rowcount == 1 else None
+	try:
+		with db.session.begin_nested():
+			res = db.session.execute(insert(table).values(**values))
+	except IntegrityError:
+		return None
+	return res.inserted_primary_key
+
+
+def _update_then_insert(table, rows, key_cols, inc_cols) -> None:
+	for row in rows:
+		cond = [table.c[k] == row[k] for k in key_cols]
+		res = db.session.execute(
+			table.update().where(*cond).values({c: table.c[c] + row.get(c, 0) for c in inc_cols})
+		)
+		if not res.rowcount:
+			db.session.execute(insert(table).values(**row))
+
+
+def chunked(items, size: int = 500):
+	# Keeps IN (...) lists under the driver's bound-parameter limits
+	items = list(items)
+	for i in range(0, len(items), size):
+		yield items[i:i + size]
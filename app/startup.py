@@ -0,0 +1,50 @@
+import time
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from . import db
+
+# Filled by warm(); the gunicorn hooks report it
+timings: dict[str, float] = {}
+
+
+def precompile_templates(app: Flask) -> int:
+	# Loads every template once: compiled code stays in the environment's cache (shared with forked
+	# workers under preload) and the bytecode lands in JINJA_BYTECODE_CACHE_DIR for the next boot
+	count = 0
+	for name in app.jinja_env.list_templates(extensions=("html", "txt", "xml")):
+		app.jinja_env.get_template(name)
+		count += 1
+	return count
+
+
+def warm(app: Flask, started: float) -> dict[str, float]:
+	# Everything a first request would otherwise pay for; started is when create_app was called
+	timings["create_app"] = time.perf_counter() - started
+	step = time.perf_counter()
+	configure_mappers()
+	timings["mappers"] = time.perf_counter() - step
+	step = time.perf_counter()
+	timings["templates"] = float(precompile_templates(app))
+	timings["template_seconds"] = time.perf_counter() - step
+	timings["total"] = time.perf_counter() - started
+	return timings
+
+
+def summary() -> str:
+	if not timings:
+		return "startup warm-up skipped"
+	return (
+		f"app ready in {timings['total']:.2f}s: create_app {timings['create_app']:.2f}s, "
+		f"mappers {timings['mappers']:.2f}s, {int(timings['templates'])} templates {timings['template_seconds']:.2f}s"
+	)
+
+
+def after_fork(app: Flask) -> None:
+	# Connections opened in the master (if any) belong to it; the child drops its copies without closing
+	# the sockets under the parent, then opens one of its own so the first request doesn't wait on connect
+	with app.app_context():
+		for engine in db.engines.values():
+			engine.dispose(close=False)
+			with engine.connect() as connection:
+				connection.execute(text("SELECT 1"))
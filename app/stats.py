@@ -0,0 +1,196 @@
+from collections import Counter
+from typing import Iterable, Optional
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import joinedload
+from . import db, jobs
+from .models import StatCounter, User, Scholarship, Application
+from .sqlutil import upsert_increment
+from .jobs import handler
+
+# Counter keys kept in the stat_counters rollup table
+STUDENTS = "students"
+ALLOCATED = "allocated"
+BUILT = "_built"
+STATUS_PREFIX = "status:"
+CATEGORY_PREFIX = "category:"
+DEPARTMENT_PREFIX = "department:"
+RECENT_LIMIT = 5
+
+stats_cli = AppGroup("stats", help="Dashboard statistics rollup.")
+
+
+def status_key(status: str) -> str:
+	return f"{STATUS_PREFIX}{status}"
+
+
+def category_key(category: Optional[str]) -> str:
+	return f"{CATEGORY_PREFIX}{category or ''}"
+
+
+def department_key(department: Optional[str]) -> str:
+	return f"{DEPARTMENT_PREFIX}{department or ''}"
+
+
+def bump(deltas: dict) -> None:
+	# Applied inside the caller's transaction, so the rollup commits together with the change it describes
+	rows = [{"key": k, "value": float(v)} for k, v in deltas.items() if v]
+	upsert_increment(StatCounter.__table__, rows, ("key",), ("value",))
+
+
+def application_submitted(student: User) -> None:
+	deltas = {status_key("pending"): 1}
+	if student.role == "student":
+		deltas[department_key(student.department)] = 1
+	bump(deltas)
+
+
+def application_decided(old_status: str, new_status: str, amount: float) -> None:
+	if old_status == new_status:
+		return
+	deltas = Counter({status_key(old_status): -1, status_key(new_status): 1})
+	if new_status == "approved":
+		deltas[ALLOCATED] += float(amount)
+	elif old_status == "approved":
+		deltas[ALLOCATED] -= float(amount)
+	bump(deltas)
+
+
+def department_changed(user: User, old_department: Optional[str], new_department: Optional[str]) -> None:
+	# The breakdown follows the student's current department, so their applications move with them
+	if user.role != "student" or (old_department or "") == (new_department or ""):
+		return
+	count = db.session.query(func.count(Application.application_id)).filter(Application.student_id == user.user_id).scalar() or 0
+	bump({department_key(old_department): -count, department_key(new_department): count})
+
+
+def student_registered(user: User) -> None:
+	if user.role == "student":
+		bump({STUDENTS: 1})
+
+
+def scholarship_created(sch: Scholarship) -> None:
+	bump({category_key(sch.category): 1})
+
+
+def scholarship_deleted(sch: Scholarship) -> None:
+	# Its applications go with it through the ORM cascade, so take them out of the rollup too
+	deltas = Counter({category_key(sch.category): -1})
+	rows = (
+		db.session.query(Application.status, User.role, User.department, func.count(Application.application_id))
+		.join(User, User.user_id == Application.student_id)
+		.filter(Application.scholarship_id == sch.scholarship_id)
+		.group_by(Application.status, User.role, User.department)
+		.all()
+	)
+	for status, role, department, count in rows:
+		deltas[status_key(status)] -= count
+		if role == "student":
+			deltas[department_key(department)] -= count
+		if status == "approved":
+			deltas[ALLOCATED] -= count * float(sch.amount)
+	bump(deltas)
+
+
+def compute() -> Counter:
+	# Every counter from the source tables; reads only
+	counters = Counter({BUILT: 1})
+	counters[STUDENTS] = db.session.query(User).filter_by(role="student").count()
+	for status, count in db.session.query(Application.status, func.count(Application.application_id)).group_by(Application.status):
+		counters[status_key(status)] = count
+	counters[ALLOCATED] = float(
+		db.session.query(func.coalesce(func.sum(Scholarship.amount), 0))
+		.join(Application, Application.scholarship_id == Scholarship.scholarship_id)
+		.filter(Application.status == "approved")
+		.scalar() or 0
+	)
+	for category, count in db.session.query(Scholarship.category, func.count(Scholarship.scholarship_id)).group_by(Scholarship.category):
+		counters[category_key(category)] = count
+	dept_rows = (
+		db.session.query(User.department, func.count(Application.application_id))
+		.join(Application, Application.student_id == User.user_id)
+		.filter(User.role == "student")
+		.group_by(User.department)
+	)
+	for department, count in dept_rows:
+		counters[department_key(department)] = count
+	return counters
+
+
+def rebuild() -> int:
+	counters = compute()
+	db.session.query(StatCounter).delete()
+	db.session.add_all(StatCounter(key=k, value=float(v)) for k, v in counters.items())
+	db.session.flush()
+	return len(counters)
+
+
+def _breakdown(values: dict, prefix: str) -> dict:
+	out = {}
+	for key, value in values.items():
+		if key.startswith(prefix) and value > 0:
+			out[key[len(prefix):] or None] = int(value)
+	return out
+
+
+def snapshot() -> dict:
+	values = dict(db.session.query(StatCounter.key, StatCounter.value).all())
+	if BUILT not in values:
+		# Not built yet (or a lagging replica): count live for this request and let the worker build the
+		# table. Rebuilding here would have concurrent dashboard loads racing to insert the same keys.
+		values = dict(compute())
+		if not jobs.pending("stats.rebuild"):
+			jobs.enqueue("stats.rebuild", priority=20)
+			db.session.commit()
+	return {
+		"total_students": int(values.get(STUDENTS, 0)),
+		"pending": int(values.get(status_key("pending"), 0)),
+		"approved": int(values.get(status_key("approved"), 0)),
+		"rejected": int(values.get(status_key("rejected"), 0)),
+		"total_allocated": values.get(ALLOCATED, 0),
+		"by_category": _breakdown(values, CATEGORY_PREFIX),
+		"by_department": _breakdown(values, DEPARTMENT_PREFIX),
+	}
+
+
+def recent_by_status(statuses: Iterable[str], limit: int = RECENT_LIMIT) -> dict:
+	# One UNION ALL of per-status top-N index scans, then one eager load of just those rows
+	statuses = list(statuses)
+	parts = [
+		select(Application.application_id)
+		.where(Application.status == s)
+		.order_by(Application.submitted_date.desc(), Application.application_id.desc())
+		.limit(limit)
+		.subquery()
+		.select()
+		for s in statuses
+	]
+	ids = [row[0] for row in db.session.execute(union_all(*parts))]
+	out = {s: [] for s in statuses}
+	if not ids:
+		return out
+	items = (
+		db.session.query(Application)
+		.options(joinedload(Application.student), joinedload(Application.scholarship))
+		.filter(Application.application_id.in_(ids))
+		.order_by(Application.submitted_date.desc(), Application.application_id.desc())
+		.all()
+	)
+	for a in items:
+		out[a.status].append(a)
+	return out
+
+
+@handler("stats.rebuild")
+def rebuild_job(payloads: list[dict]) -> None:
+	rebuild()
+	db.session.commit()
+
+
+@stats_cli.command("rebuild")
+def rebuild_command():
+	"""Recompute every dashboard counter from the source tables."""
+	count = rebuild()
+	db.session.commit()
+	click.echo(f"Rebuilt {count} counters")
@@ -0,0 +1,198 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+import click
+from flask import Response, abort, current_app, request
+from flask.cli import AppGroup
+from sqlalchemy import select
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename, send_file
+from . import db
+from .models import Application
+from .utils import ALLOWED_DOC_EXTENSIONS
+from .jobs import handler
+
+BLOB_DIR = "blobs"
+TMP_DIR = "tmp"
+PREVIEW_DIR = "previews"
+CHUNK_SIZE = 64 * 1024
+
+uploads_cli = AppGroup("uploads", help="Uploaded document storage.")
+
+
+def _upload_root() -> str:
+	return current_app.config["UPLOAD_FOLDER"]
+
+
+def blob_path(digest: str, ext: str) -> str:
+	# Relative to UPLOAD_FOLDER; fanned out on the first two hex digits
+	return f"{BLOB_DIR}/{digest[:2]}/{digest}.{ext}"
+
+
+def preview_path(rel: str) -> str:
+	# Previews of blobs share the blob's digest; legacy paths are keyed by a hash of the path
+	rel = rel.replace("\\", "/")
+	digest = _blob_digest(rel) or hashlib.sha256(rel.encode("utf-8")).hexdigest()
+	return f"{PREVIEW_DIR}/{digest}.jpg"
+
+
+def _hash_stream(stream) -> str:
+	h = hashlib.sha256()
+	for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+		h.update(chunk)
+	return h.hexdigest()
+
+
+def _write_stream(stream, root: str) -> tuple[str, str]:
+	# Hash while copying to a temp file on the same filesystem, ready for an atomic rename
+	tmp_dir = os.path.join(root, TMP_DIR)
+	os.makedirs(tmp_dir, exist_ok=True)
+	h = hashlib.sha256()
+	fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+	try:
+		with os.fdopen(fd, "wb") as out:
+			for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+				h.update(chunk)
+				out.write(chunk)
+	except BaseException:
+		os.remove(tmp)
+		raise
+	return h.hexdigest(), tmp
+
+
+def save_uploaded(file_storage) -> str:
+	# Content-addressed: identical documents share one blob, whatever they were called
+	if not file_storage or not getattr(file_storage, "filename", ""):
+		return ""
+	filename = secure_filename(file_storage.filename)
+	ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+	if ext not in ALLOWED_DOC_EXTENSIONS:
+		raise ValueError("Invalid file type. Allowed: pdf, jpg, jpeg, png")
+	root = _upload_root()
+	stream = file_storage.stream
+	tmp = None
+	if stream.seekable():
+		# Werkzeug has already spooled the upload, so hash it first and skip the write on a hit
+		start = stream.tell()
+		digest = _hash_stream(stream)
+		stream.seek(start)
+	else:
+		digest, tmp = _write_stream(stream, root)
+	rel = blob_path(digest, ext)
+	dest = os.path.join(root, rel)
+	if os.path.exists(dest):
+		if tmp:
+			os.remove(tmp)
+		os.utime(dest)  # a fresh reference; keeps gc's grace period from reclaiming it
+		return rel
+	if tmp is None:
+		digest_check, tmp = _write_stream(stream, root)
+		if digest_check != digest:
+			os.remove(tmp)
+			raise ValueError("Upload changed while it was being stored")
+	os.makedirs(os.path.dirname(dest), exist_ok=True)
+	os.replace(tmp, dest)
+	return rel
+
+
+def _blob_digest(rel: str) -> str:
+	# blobs/ab/<sha256>.<ext> -> <sha256>, else ""
+	if not rel.startswith(BLOB_DIR + "/"):
+		return ""
+	name = rel.rsplit("/", 1)[-1].split(".", 1)[0]
+	return name if len(name) == 64 else ""
+
+
+def send_upload(rel: str) -> Response:
+	cfg = current_app.config
+	root = _upload_root()
+	full = safe_join(root, rel)
+	if full is None or not os.path.isfile(full):
+		abort(404)
+	rel = rel.replace("\\", "/")
+	digest = _blob_digest(rel)
+	# Blobs never change under their name, so the digest is a strong ETag and clients may keep them;
+	# anything else must be revalidated (cheaply, via 304)
+	max_age = cfg["UPLOAD_BLOB_MAX_AGE"] if digest else 0
+	mode = cfg["UPLOAD_SENDFILE"]
+	if mode == "x-accel":
+		# nginx serves the bytes (and Range) from an internal location; we only answer 304s
+		st = os.stat(full)
+		rv = Response(status=200, mimetype=mimetypes.guess_type(full)[0] or "application/octet-stream")
+		rv.headers["X-Accel-Redirect"] = cfg["UPLOAD_ACCEL_PREFIX"].rstrip("/") + "/" + rel
+		rv.set_etag(digest or f"{int(st.st_mtime)}-{st.st_size}")
+		rv.last_modified = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc)
+		rv = rv.make_conditional(request)
+	else:
+		rv = send_file(
+			full,
+			environ=request.environ,
+			conditional=True,
+			etag=digest or True,
+			max_age=max_age,
+			use_x_sendfile=mode == "x-sendfile",
+		)
+	rv.cache_control.public = False
+	rv.cache_control.private = True
+	rv.cache_control.max_age = max_age
+	if digest:
+		rv.cache_control.immutable = True
+	else:
+		rv.cache_control.no_cache = True
+	return rv
+
+
+def referenced_paths() -> set[str]:
+	refs: set[str] = set()
+	result = db.session.execute(
+		select(Application.income_proof_path, Application.govt_id_path)
+		.execution_options(stream_results=True, yield_per=5000)
+	)
+	for income, govt in result:
+		if income:
+			refs.add(income.replace("\\", "/"))
+		if govt:
+			refs.add(govt.replace("\\", "/"))
+	return refs
+
+
+def collect_garbage(grace_seconds: float, dry_run: bool = False) -> tuple[int, int]:
+	root = _upload_root()
+	refs = referenced_paths()
+	refs.update([preview_path(r) for r in refs])
+	cutoff = time.time() - grace_seconds
+	removed = freed = 0
+	for sub in (BLOB_DIR, TMP_DIR, PREVIEW_DIR):
+		for dirpath, _dirs, files in os.walk(os.path.join(root, sub)):
+			for name in files:
+				full = os.path.join(dirpath, name)
+				rel = os.path.relpath(full, root).replace("\\", "/")
+				try:
+					st = os.stat(full)
+				except FileNotFoundError:
+					continue
+				if rel in refs or st.st_mtime > cutoff:
+					continue
+				removed += 1
+				freed += st.st_size
+				if not dry_run:
+					os.remove(full)
+	return removed, freed
+
+
+@handler("uploads.gc")
+def gc_job(payloads: list[dict]) -> None:
+	collect_garbage(float(payloads[0].get("grace_hours", 24)) * 3600)
+
+
+@uploads_cli.command("gc")
+@click.option("--grace-hours", type=float, default=24.0, help="Keep unreferenced blobs younger than this.")
+@click.option("--dry-run", is_flag=True)
+def gc_command(grace_hours: float, dry_run: bool):
+	"""Delete stored blobs that no application references."""
+	removed, freed = collect_garbage(grace_hours * 3600, dry_run)
+	verb = "Would remove" if dry_run else "Removed"
+	click.echo(f"{verb} {removed} file(s), {freed / (1024 * 1024):.1f} MiB")
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+import click
+from flask import current_app, request
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, inspect, select
+from . import db, stats, jobs, reports, previews
+from .models import Application, IdempotencyKey, Scholarship, User
+from .sqlutil import insert_or_ignore
+
+MAX_KEY_LENGTH = 100
+UNIQUE_INDEX = "uq_applications_student_scholarship"
+
+# Engine URL -> True once the unique index has been seen; a missing index is looked up again each time
+_index_seen: dict[str, bool] = {}
+
+submissions_cli = AppGroup("submissions", help="Application submission integrity.")
+
+
+class KeyReused(Exception):
+	# The same Idempotency-Key arrived with a different request
+	pass
+
+
+def submit(student: User, scholarship_id: int, cgpa_value: Optional[float], income_path: str = "", govt_id_path: str = "") -> Optional[int]:
+	# Duplicate check and insert in one statement; None means the student had already applied
+	submitted = datetime.utcnow()
+	values = {
+		"student_id": student.user_id,
+		"scholarship_id": scholarship_id,
+		"status": "pending",
+		"submitted_date": submitted,
+		"cgpa_value": cgpa_value,
+		"income_proof_path": income_path,
+		"govt_id_path": govt_id_path,
+	}
+	if unique_index_present():
+		row = insert_or_ignore(Application.__table__, values, ("student_id", "scholarship_id"))
+	else:
+		# Database from before the index: nothing for ON CONFLICT to match, so check then insert as the
+		# portal used to (a race can still slip a duplicate through until the index is created)
+		exists = db.session.query(Application.application_id).filter_by(student_id=student.user_id, scholarship_id=scholarship_id).first()
+		row = None if exists else db.session.execute(insert(Application).values(**values)).inserted_primary_key
+	if row is None:
+		return None
+	stats.application_submitted(student)
+	scholarship = db.session.get(Scholarship, scholarship_id)  # usually already in the session
+	reports.application_submitted(row[0], submitted, scholarship.category if scholarship else None, student.department)
+	previews.schedule([income_path, govt_id_path])
+	return row[0]
+
+
+def new_key() -> str:
+	# Rendered into each apply form, so a double-click or a resubmitted page carries the same key
+	return uuid.uuid4().hex
+
+
+def request_key() -> str:
+	key = (request.headers.get("Idempotency-Key") or request.form.get("idempotency_key") or "").strip()
+	return key[:MAX_KEY_LENGTH]
+
+
+def fingerprint(*parts) -> str:
+	return hashlib.sha256(json.dumps([request.endpoint, *parts], default=str).encode("utf-8")).hexdigest()
+
+
+def replay(user_id: int, key: str, fp: str) -> Optional[tuple[int, dict]]:
+	# Primary-key lookup of a stored response, before any file or row is written
+	stored = db.session.get(IdempotencyKey, (user_id, key))
+	if stored is None:
+		return None
+	if stored.created_at < datetime.utcnow() - timedelta(seconds=current_app.config["IDEMPOTENCY_TTL"]):
+		db.session.delete(stored)
+		db.session.flush()
+		return None
+	if stored.fingerprint != fp:
+		raise KeyReused(key)
+	return stored.status_code, json.loads(stored.response)
+
+
+def remember(user_id: int, key: str, fp: str, status_code: int, response: dict) -> bool:
+	# In the submission's own transaction; False if a concurrent retry with this key committed first
+	row = insert_or_ignore(
+		IdempotencyKey.__table__,
+		{
+			"user_id": user_id,
+			"key": key,
+			"fingerprint": fp,
+			"status_code": status_code,
+			"response": json.dumps(response),
+			"created_at": datetime.utcnow(),
+		},
+		("user_id", "key"),
+	)
+	return row is not None
+
+
+def purge_expired() -> int:
+	cutoff = datetime.utcnow() - timedelta(seconds=current_app.config["IDEMPOTENCY_TTL"])
+	return db.session.query(IdempotencyKey).filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+
+
+@jobs.handler("idempotency.purge")
+def purge_job(payloads: list[dict]) -> None:
+	purge_expired()
+	db.session.commit()
+
+
+def unique_index_present() -> bool:
+	bind = db.session.get_bind()
+	key = str(bind.url)
+	if not _index_seen.get(key):
+		indexes = inspect(db.session.connection()).get_indexes(Application.__tablename__)
+		_index_seen[key] = any(i["name"] == UNIQUE_INDEX for i in indexes)
+	return _index_seen[key]
+
+
+def ensure_unique_index() -> list[tuple[int, int, int]]:
+	# Idempotent. Returns the duplicate (student, scholarship, count) pairs that stop the index being
+	# created; empty once it is in place. The caller commits.
+	dupes = duplicate_pairs()
+	if not dupes:
+		index = next(i for i in Application.__table__.indexes if i.name == UNIQUE_INDEX)
+		index.create(db.session.connection(), checkfirst=True)
+	return dupes
+
+
+def duplicate_pairs(limit: int = 50) -> list[tuple[int, int, int]]:
+	return db.session.execute(
+		select(Application.student_id, Application.scholarship_id, func.count(Application.application_id))
+		.group_by(Application.student_id, Application.scholarship_id)
+		.having(func.count(Application.application_id) > 1)
+		.limit(limit)
+	).all()
+
+
+@submissions_cli.command("unique-index")
+def unique_index_command():
+	"""Add the one-application-per-scholarship unique index to an existing database."""
+	dupes = ensure_unique_index()
+	if dupes:
+		click.echo("Resolve these duplicate applications first (student, scholarship, count):")
+		for student_id, scholarship_id, count in dupes:
+			click.echo(f"  {student_id}, {scholarship_id}, {count}")
+		raise SystemExit(1)
+	db.session.commit()
+	click.echo("Unique index on (student_id, scholarship_id) is in place")
@@ -0,0 +1,258 @@
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+import click
+import numpy as np
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, select, text
+from . import db, reports, stats, versions
+from .models import AllocationEntry, Application, Finance, Scholarship, User
+from .ledger import OPENING
+from .utils import hash_password
+
+CHUNK_SIZE = 50_000
+DEPARTMENTS = {"CSE": 0.28, "ECE": 0.18, "MECH": 0.14, "EEE": 0.12, "CIVIL": 0.10, "IT": 0.10, "CHEM": 0.05, "BIO": 0.03}
+# category -> (share of the catalogue, median amount, min_cgpa choices, income_limit choices)
+CATEGORIES = {
+	"merit": (0.30, 40_000, (7.5, 8.0, 8.5, 9.0), (None,)),
+	"need": (0.30, 30_000, (None, 6.0), (250_000, 300_000, 500_000, 800_000)),
+	"minority": (0.12, 25_000, (None, 6.0, 6.5), (None, 600_000)),
+	"sports": (0.10, 20_000, (None,), (None,)),
+	"research": (0.10, 60_000, (8.0, 8.5), (None,)),
+	"women-in-stem": (0.08, 35_000, (None, 7.0), (None, 800_000)),
+}
+NAME_WORDS = ("Excellence", "Support", "Foundation", "Endowment", "Fellowship", "Grant", "Award", "Trust", "Bursary", "Initiative")
+
+synthetic_cli = AppGroup("synthetic", help="Scale-test data.")
+
+
+def _naive_utc_now() -> datetime:
+	return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _insert_chunks(table, rows, chunk_size: int) -> None:
+	# Core executemany per chunk, committed as it goes so memory and the transaction stay bounded
+	for start in range(0, len(rows), chunk_size):
+		db.session.execute(insert(table), rows[start:start + chunk_size])
+		db.session.commit()
+
+
+def _students(rng: np.random.Generator, count: int, first_index: int, password_hash: str, chunk_size: int) -> None:
+	departments = rng.choice(list(DEPARTMENTS), size=count, p=list(DEPARTMENTS.values()))
+	cgpa = np.clip(rng.normal(7.4, 1.1, count), 4.0, 10.0).round(2)
+	# Incomes are right-skewed: most families well under the median, a long tail above
+	income = np.clip(rng.lognormal(np.log(350_000), 0.7, count), 30_000, 5_000_000).round(-3)
+	for start in range(0, count, chunk_size):
+		stop = min(start + chunk_size, count)
+		db.session.execute(insert(User), [
+			{
+				"name": f"Student {first_index + i}",
+				"email": f"student{first_index + i}@synthetic.example",
+				"password_hash": password_hash,
+				"role": "student",
+				"department": str(departments[i]),
+				"cgpa": float(cgpa[i]),
+				"family_income": float(income[i]),
+			}
+			for i in range(start, stop)
+		])
+		db.session.commit()
+
+
+def _scholarships(rng: np.random.Generator, count: int, today: date, chunk_size: int) -> None:
+	names = list(CATEGORIES)
+	picks = rng.choice(names, size=count, p=[CATEGORIES[c][0] for c in names])
+	# Windows open over the last two years and the coming quarter; most run one to three months
+	opens = rng.integers(-730, 90, count)
+	lengths = rng.integers(30, 100, count)
+	if count and (opens > 0).all():
+		opens[0] = -int(rng.integers(0, 30))  # something must be open to apply to
+	rows = []
+	for i in range(count):
+		category = str(picks[i])
+		_share, median, cgpas, incomes = CATEGORIES[category]
+		start = today + timedelta(days=int(opens[i]))
+		min_cgpa = cgpas[rng.integers(len(cgpas))]
+		income_limit = incomes[rng.integers(len(incomes))]
+		rule = []
+		if min_cgpa:
+			rule.append(f"CGPA >= {min_cgpa}")
+		if income_limit:
+			rule.append(f"family income <= {income_limit // 1000}k")
+		rows.append({
+			"name": f"{category.replace('-', ' ').title()} {NAME_WORDS[rng.integers(len(NAME_WORDS))]} {i + 1}",
+			"category": category,
+			"eligibility": "; ".join(rule) or "Open to all enrolled students",
+			"amount": float(round(rng.lognormal(np.log(median), 0.35), -3)),
+			"start_date": start,
+			"end_date": start + timedelta(days=int(lengths[i])),
+			"min_cgpa": min_cgpa,
+			"income_limit": income_limit,
+		})
+	_insert_chunks(Scholarship.__table__, rows, chunk_size)
+
+
+def _applications(rng: np.random.Generator, target: int, student_ids: np.ndarray, sch: dict, reviewer_id: Optional[int], today: date, chunk_size: int) -> tuple[int, dict]:
+	sch_ids = sch["id"]
+	if not target or not len(student_ids) or not len(sch_ids):
+		return 0, {}
+	# Popularity is Zipf-like: a few schemes draw most of the applications
+	popularity = rng.permutation(1.0 / np.arange(1, len(sch_ids) + 1) ** 0.8)
+	popularity[sch["start"] > np.datetime64(today)] = 0  # not open yet
+	if not popularity.sum():
+		popularity[:] = 1.0  # only adding to a catalogue that hasn't opened yet: spread them evenly
+	popularity /= popularity.sum()
+	# Draw (student, scholarship) pairs and drop repeats so each student applies once per scheme; popular
+	# schemes collide often on small data sets, so top up a few times before settling for fewer
+	keys = np.empty(0, dtype=np.int64)
+	for _ in range(8):
+		missing = target - len(keys)
+		if missing <= 0:
+			break
+		draw = int(missing * 1.1) + 100
+		fresh = rng.choice(student_ids, size=draw) * len(sch_ids) + rng.choice(len(sch_ids), size=draw, p=popularity)
+		keys = np.concatenate([keys, fresh])
+		_unique, first = np.unique(keys, return_index=True)
+		keys = keys[np.sort(first)]
+	keys = rng.permutation(keys[:target])
+	pairs = np.stack([keys // len(sch_ids), keys % len(sch_ids)], axis=1)
+	n = len(pairs)
+	idx = pairs[:, 1]
+	start = sch["start"][idx]
+	length = (sch["end"][idx] - start).astype(np.int64)
+	# Submissions pile up against the deadline: distance from the close is skewed towards zero
+	before_close = (length * 86400 * rng.beta(1.0, 4.0, n)).astype(np.int64)
+	submitted_ts = sch["end_ts"][idx] + 86400 - before_close
+	now_ts = int(time.time())
+	submitted_ts = np.minimum(submitted_ts, now_ts - rng.integers(0, 3600, n))
+	closed = sch["end"][idx] < np.datetime64(today)
+	# Closed schemes are mostly decided; open ones mostly still pending
+	roll = rng.random(n)
+	status = np.where(closed, np.where(roll < 0.30, 1, np.where(roll < 0.85, 2, 0)), np.where(roll < 0.05, 1, np.where(roll < 0.15, 2, 0)))
+	cgpa = np.clip(rng.normal(7.6, 1.0, n), 4.0, 10.0).round(2)
+	labels = ("pending", "approved", "rejected")
+	allocated: dict[int, float] = defaultdict(float)
+	rows = []
+	for i in range(n):
+		submitted = datetime.fromtimestamp(int(submitted_ts[i]), tz=timezone.utc).replace(tzinfo=None)
+		s = int(status[i])
+		rows.append({
+			"student_id": int(pairs[i, 0]),
+			"scholarship_id": int(sch_ids[idx[i]]),
+			"status": labels[s],
+			"submitted_date": submitted,
+			"reviewed_by": reviewer_id if s else None,
+			"remarks": None,
+			"cgpa_value": float(cgpa[i]),
+		})
+		if s == 1:
+			allocated[submitted.year] += float(sch["amount"][idx[i]])
+		if len(rows) == chunk_size:
+			db.session.execute(insert(Application), rows)
+			db.session.commit()
+			rows = []
+	if rows:
+		db.session.execute(insert(Application), rows)
+		db.session.commit()
+	return n, allocated
+
+
+def _ledger_and_budgets(allocated: dict, chunk_size: int) -> None:
+	# Opening entries for the generated approvals, and a budget per year with some headroom
+	approved = db.session.execute(
+		select(Application.application_id, Application.submitted_date, Scholarship.amount)
+		.join(Scholarship, Scholarship.scholarship_id == Application.scholarship_id)
+		.where(Application.status == "approved")
+		.where(~select(AllocationEntry.application_id).where(AllocationEntry.application_id == Application.application_id).exists())
+	).all()
+	now = _naive_utc_now()
+	entries = [{"application_id": a, "year": d.year, "amount": float(amt), "kind": OPENING, "created_at": now} for a, d, amt in approved]
+	_insert_chunks(AllocationEntry.__table__, entries, chunk_size)
+	for year, amount in sorted(allocated.items()):
+		fund = db.session.query(Finance).filter_by(year=year).first()
+		if fund is None:
+			fund = Finance(year=year, budget_amount=round(amount * 1.25, -5), allocated_amount=0)
+			db.session.add(fund)
+		fund.allocated_amount = float(fund.allocated_amount or 0) + amount
+		fund.budget_amount = max(float(fund.budget_amount or 0), fund.allocated_amount)
+		fund.recalc()
+	db.session.commit()
+
+
+def generate(students: int, scholarships: int, applications: int, seed: int = 1, password: str = "password", chunk_size: int = CHUNK_SIZE, log=None) -> dict:
+	# Runs inside an app context; adds to whatever is already there. Bad counts are refused before anything is written.
+	if min(students, scholarships, applications) < 0 or chunk_size < 1:
+		raise ValueError("counts can't be negative and chunk_size must be at least 1")
+	if applications and not (students and scholarships):
+		raise ValueError("applications need at least one new student and one new scholarship")
+	log = log or (lambda msg: None)
+	rng = np.random.default_rng(seed)
+	today = date.today()
+	timings = {}
+	if db.session.get_bind().dialect.name == "sqlite":
+		# Bulk load: durability only matters once it's done (this connection only)
+		db.session.execute(text("PRAGMA synchronous = OFF"))
+
+	started = time.perf_counter()
+	password_hash = hash_password(password)  # one real hash shared by every generated account
+	first_index = (db.session.query(func.max(User.user_id)).scalar() or 0) + 1
+	reviewer_id = db.session.query(User.user_id).filter(User.role == "admin").order_by(User.user_id).limit(1).scalar()
+	if reviewer_id is None:
+		db.session.execute(insert(User), [{"name": "Synthetic Admin", "email": f"admin{first_index}@synthetic.example", "password_hash": password_hash, "role": "admin"}])
+		db.session.commit()
+		reviewer_id = db.session.query(func.max(User.user_id)).scalar()
+		first_index += 1
+	first_student = db.session.query(func.max(User.user_id)).scalar() or 0
+	_students(rng, students, first_index, password_hash, chunk_size)
+	timings["students"] = time.perf_counter() - started
+	log(f"{students:,} students in {timings['students']:.1f}s")
+
+	started = time.perf_counter()
+	first_scholarship = db.session.query(func.max(Scholarship.scholarship_id)).scalar() or 0
+	_scholarships(rng, scholarships, today, chunk_size)
+	versions.bump(versions.SCHOLARSHIPS)
+	db.session.commit()
+	timings["scholarships"] = time.perf_counter() - started
+	log(f"{scholarships:,} scholarships in {timings['scholarships']:.1f}s")
+
+	started = time.perf_counter()
+	student_ids = np.array(db.session.execute(select(User.user_id).where(User.user_id > first_student, User.role == "student")).scalars().all(), dtype=np.int64)
+	rows = db.session.execute(
+		select(Scholarship.scholarship_id, Scholarship.start_date, Scholarship.end_date, Scholarship.amount)
+		.where(Scholarship.scholarship_id > first_scholarship)
+	).all()
+	sch = {
+		"id": np.array([r[0] for r in rows], dtype=np.int64),
+		"start": np.array([r[1] for r in rows], dtype="datetime64[D]"),
+		"end": np.array([r[2] for r in rows], dtype="datetime64[D]"),
+		"amount": np.array([r[3] for r in rows], dtype=float),
+	}
+	sch["end_ts"] = sch["end"].astype("datetime64[s]").astype(np.int64)
+	created, allocated = _applications(rng, applications, student_ids, sch, reviewer_id, today, chunk_size)
+	timings["applications"] = time.perf_counter() - started
+	log(f"{created:,} applications in {timings['applications']:.1f}s")
+
+	started = time.perf_counter()
+	_ledger_and_budgets(allocated, chunk_size)
+	stats.rebuild()
+	reports.rebuild()
+	db.session.commit()
+	timings["rollups"] = time.perf_counter() - started
+	log(f"ledger, budgets, dashboard counters and daily rollups in {timings['rollups']:.1f}s")
+	return {"students": students, "scholarships": scholarships, "applications": created, "seconds": timings}
+
+
+@synthetic_cli.command("generate")
+@click.option("--students", type=click.IntRange(min=0), default=100_000, show_default=True)
+@click.option("--scholarships", type=click.IntRange(min=0), default=2_000, show_default=True)
+@click.option("--applications", type=click.IntRange(min=0), default=1_000_000, show_default=True)
+@click.option("--seed", type=int, default=1, show_default=True)
+@click.option("--password", default="password", show_default=True, help="Shared by every generated account.")
+@click.option("--chunk-size", type=click.IntRange(min=1), default=CHUNK_SIZE, show_default=True)
+def generate_command(students: int, scholarships: int, applications: int, seed: int, password: str, chunk_size: int):
+	"""Bulk-generate students, scholarships and applications for scale testing."""
+	if applications and not (students and scholarships):
+		raise click.UsageError("--applications needs at least one student and one scholarship")
+	db.create_all()
+	generate(students, scholarships, applications, seed, password, chunk_size, log=click.echo)
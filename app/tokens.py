@@ -0,0 +1,60 @@
+import hashlib
+from typing import Optional
+from flask import current_app
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from . import db, login_manager
+from .models import User, attach_user
+
+ACCESS_SALT = "api-access"
+REFRESH_SALT = "api-refresh"
+
+
+def _serializer(salt: str) -> URLSafeTimedSerializer:
+	return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=salt)
+
+
+def _password_fingerprint(user: User) -> str:
+	# Refresh tokens die with the password they were issued under
+	return hashlib.sha256(user.password_hash.encode("utf-8")).hexdigest()[:16]
+
+
+def issue_tokens(user: User) -> dict:
+	cfg = current_app.config
+	return {
+		# Signed, not encrypted: anyone holding the token can read it, so it carries no personal data
+		"access_token": _serializer(ACCESS_SALT).dumps({"uid": user.user_id, "role": user.role, "name": user.name}),
+		"refresh_token": _serializer(REFRESH_SALT).dumps({"uid": user.user_id, "pw": _password_fingerprint(user)}),
+		"token_type": "Bearer",
+		"expires_in": cfg["API_ACCESS_TOKEN_TTL"],
+	}
+
+
+def _load(token: str, salt: str, max_age: int) -> Optional[dict]:
+	try:
+		data = _serializer(salt).loads(token, max_age=max_age)
+	except (BadSignature, SignatureExpired):
+		return None
+	return data if isinstance(data, dict) else None
+
+
+def user_from_refresh_token(token: str) -> Optional[User]:
+	claims = _load(token, REFRESH_SALT, current_app.config["API_REFRESH_TOKEN_TTL"])
+	if not claims:
+		return None
+	user = db.session.get(User, claims.get("uid"))
+	if not user or claims.get("pw") != _password_fingerprint(user):
+		return None
+	return user
+
+
+@login_manager.request_loader
+def load_user_from_request(request) -> Optional[User]:
+	# Bearer access tokens carry the id and role claims, so role checks need no database round trip;
+	# other columns load on first use
+	header = request.headers.get("Authorization", "")
+	if not header.startswith("Bearer "):
+		return None
+	claims = _load(header[7:].strip(), ACCESS_SALT, current_app.config["API_ACCESS_TOKEN_TTL"])
+	if not claims or "uid" not in claims:
+		return None
+	return attach_user({"user_id": claims["uid"], "role": claims.get("role"), "name": claims.get("name")})
@@ -1,15 +1,26 @@
 import os
 import bcrypt
 from functools import wraps
-from flask import current_app, abort
+from typing import Optional
+from flask import current_app, abort, has_app_context
 from flask_login import current_user
-from werkzeug.utils import secure_filename
 
 ALLOWED_DOC_EXTENSIONS = {"pdf", "jpg", "jpeg", "png"}
+DEFAULT_BCRYPT_ROUNDS = 12
 
 
-def hash_password(plain: str) -> str:
-	return bcrypt.hashpw(plain.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+def hash_password(plain: str, rounds: Optional[int] = None) -> str:
+	if rounds is None:
+		rounds = current_app.config.get("BCRYPT_ROUNDS", DEFAULT_BCRYPT_ROUNDS) if has_app_context() else DEFAULT_BCRYPT_ROUNDS
+	return bcrypt.hashpw(plain.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+	# "$2b$12$..." -> 12
+	try:
+		return int(hashed.split("$")[2])
+	except (AttributeError, IndexError, ValueError):
+		return None
 
 
 def check_password(plain: str, hashed: str) -> bool:
@@ -32,22 +43,6 @@ def role_required(*roles: str):
 	return decorator
 
 
-def save_uploaded(file_storage, subdir: str) -> str:
-	if not file_storage or not getattr(file_storage, "filename", ""):
-		return ""
-	filename = secure_filename(file_storage.filename)
-	ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
-	if ext not in ALLOWED_DOC_EXTENSIONS:
-		raise ValueError("Invalid file type. Allowed: pdf, jpg, jpeg, png")
-	upload_dir = os.path.join(current_app.config["UPLOAD_FOLDER"], subdir)
-	os.makedirs(upload_dir, exist_ok=True)
-	path = os.path.join(upload_dir, filename)
-	file_storage.save(path)
-	# store path relative to UPLOAD_FOLDER for portable URL building
-	rel = os.path.relpath(path, start=current_app.config["UPLOAD_FOLDER"]).replace("\\", "/")
-	return rel
-
-
 def upload_url(stored_path: str) -> str:
 	if not stored_path:
 		return ""
@@ -0,0 +1,19 @@
+from sqlalchemy import select
+from . import db
+from .cache import TTLCache
+from .models import DataVersion
+from .sqlutil import upsert_increment
+
+SCHOLARSHIPS = "scholarships"
+
+# Serialized API responses; entries are keyed by version, so a bump makes the old ones unreachable
+response_cache = TTLCache(maxsize=512, ttl=600)
+
+
+def bump(name: str) -> None:
+	# Inside the caller's transaction: readers see the new version exactly when they can see the new data
+	upsert_increment(DataVersion.__table__, [{"name": name, "version": 1}], ("name",), ("version",))
+
+
+def current(name: str) -> int:
+	return db.session.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
@@ -0,0 +1,342 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BASE_DIR = Path(__file__).resolve().parent
+PDF_BYTES = b"%PDF-1.4\n% benchmark document\n"
+
+
+@dataclass
+class Scenario:
+	# One route; build(ctx, rnd) returns (path, request kwargs) for the test client
+	endpoint: str
+	method: str
+	role: Optional[str]  # None, "student" or "admin"
+	build: Callable
+	max_requests: Optional[int] = None  # for routes whose every call scans the whole data set
+
+
+@dataclass
+class Context:
+	student_ids: list
+	scholarship_ids: list
+	application_ids: list
+	pending_ids: list
+	year: int
+	upload_path: str
+	refresh_tokens: list = field(default_factory=list)
+	disposable_scholarships: list = field(default_factory=list)
+	counter: int = 0
+	lock: threading.Lock = field(default_factory=threading.Lock)
+
+	def next(self) -> int:
+		with self.lock:
+			self.counter += 1
+			return self.counter
+
+
+def _csv(header: str, rows: list[str]) -> dict:
+	return {"data": {"csv_file": (io.BytesIO(("\n".join([header, *rows]) + "\n").encode()), "bench.csv")}, "content_type": "multipart/form-data"}
+
+
+def _new_scholarship(ctx: Context) -> dict:
+	n = ctx.next()
+	today = date.today()
+	return {
+		"name": f"Bench Scholarship {n}",
+		"category": "bench",
+		"eligibility": "Benchmark run",
+		"amount": "1000",
+		"start_date": today.isoformat(),
+		"end_date": (today + timedelta(days=30)).isoformat(),
+	}
+
+
+def _pop(items: list, lock: threading.Lock):
+	with lock:
+		return items.pop() if items else None
+
+
+SCENARIOS = [
+	# auth
+	Scenario("index", "GET", None, lambda ctx, rnd: ("/", {})),
+	Scenario("static", "GET", None, lambda ctx, rnd: ("/static/img/hero-preview.png", {})),
+	Scenario("auth.login", "GET", None, lambda ctx, rnd: ("/login", {})),
+	Scenario("auth.login_post", "POST", None, lambda ctx, rnd: ("/login", {"data": {"email": f"student{rnd.choice(ctx.student_ids)}@synthetic.example", "password": "bench"}})),
+	Scenario("auth.register", "GET", None, lambda ctx, rnd: ("/register", {})),
+	Scenario("auth.register_post", "POST", None, lambda ctx, rnd: ("/register", {"data": {"name": "Bench", "email": f"new{ctx.next()}-{os.getpid()}@bench.local", "password": "bench", "department": "CSE"}})),
+	Scenario("auth.logout", "GET", "student", lambda ctx, rnd: ("/logout", {})),
+	# admin
+	Scenario("admin.dashboard", "GET", "admin", lambda ctx, rnd: ("/admin/dashboard", {})),
+	Scenario("admin.students", "GET", "admin", lambda ctx, rnd: ("/admin/students", {})),
+	Scenario("admin.students_import", "POST", "admin", lambda ctx, rnd: ("/admin/students/import", _csv(
+		"name,email,password,department", [f"Imported,imp{ctx.next()}-{os.getpid()}-{i}@bench.local,bench,ECE" for i in range(20)]
+	)), max_requests=5),
+	Scenario("admin.scholarships_list", "GET", "admin", lambda ctx, rnd: ("/admin/scholarships", {})),
+	Scenario("admin.scholarships_create", "POST", "admin", lambda ctx, rnd: ("/admin/scholarships", {"data": _new_scholarship(ctx)})),
+	Scenario("admin.scholarships_import", "POST", "admin", lambda ctx, rnd: ("/admin/scholarships/import", _csv(
+		"name,category,eligibility,amount,start_date,end_date",
+		[f"Imported {ctx.next()},bench,Bench,500,{date.today()},{date.today() + timedelta(days=30)}" for _ in range(10)],
+	))),
+	Scenario("admin.scholarships_delete", "POST", "admin", lambda ctx, rnd: (f"/admin/scholarships/{_pop(ctx.disposable_scholarships, ctx.lock) or 0}/delete", {})),
+	Scenario("admin.applications", "GET", "admin", lambda ctx, rnd: ("/admin/applications", {"query_string": {"status": rnd.choice(["", "pending", "approved"])}})),
+	Scenario("admin.application_decision", "POST", "admin", lambda ctx, rnd: (f"/admin/applications/{rnd.choice(ctx.pending_ids)}/decision", {"data": {"status": rnd.choice(["approved", "rejected"]), "remarks": "bench"}})),
+	Scenario("admin.applications_batch_decision", "POST", "admin", lambda ctx, rnd: ("/admin/applications/batch-decision", {"data": {
+		"application_ids": [str(i) for i in rnd.sample(ctx.pending_ids, min(50, len(ctx.pending_ids)))], "status": "rejected", "remarks": "bench",
+	}})),
+	Scenario("admin.eligibility_report", "GET", "admin", lambda ctx, rnd: ("/admin/eligibility", {"query_string": {"scholarship_id": rnd.choice(ctx.scholarship_ids)}})),
+	Scenario("admin.export", "GET", "admin", lambda ctx, rnd: ("/admin/export/applications.csv", {"query_string": {"status": "approved"}}), max_requests=2),
+	Scenario("admin.jobs_view", "GET", "admin", lambda ctx, rnd: ("/admin/jobs", {})),
+	Scenario("admin.jobs_enqueue", "POST", "admin", lambda ctx, rnd: ("/admin/jobs", {"data": {"kind": "idempotency.purge"}})),
+	Scenario("admin.finance", "GET", "admin", lambda ctx, rnd: ("/admin/finance", {})),
+	Scenario("admin.finance_save", "POST", "admin", lambda ctx, rnd: ("/admin/finance", {"data": {"year": str(ctx.year), "budget_amount": str(rnd.randint(10, 50) * 10**6)}})),
+	# student
+	Scenario("student.dashboard", "GET", "student", lambda ctx, rnd: ("/student/dashboard", {})),
+	Scenario("student.scholarships", "GET", "student", lambda ctx, rnd: ("/student/scholarships", {"query_string": rnd.choice([{}, {}, {"eligible": "1"}, {"q": "merit"}])})),
+	Scenario("student.apply", "POST", "student", lambda ctx, rnd: (f"/student/apply/{rnd.choice(ctx.scholarship_ids)}", {"data": {
+		"cgpa": "9.5", "income_proof": (io.BytesIO(PDF_BYTES), "income.pdf"), "govt_id": (io.BytesIO(PDF_BYTES), "id.pdf"),
+	}, "content_type": "multipart/form-data"})),
+	Scenario("student.profile", "GET", "student", lambda ctx, rnd: ("/student/profile", {})),
+	Scenario("student.profile_post", "POST", "student", lambda ctx, rnd: ("/student/profile", {"data": {"name": "Bench Student", "department": "CSE", "cgpa": "8.1", "family_income": "250000"}})),
+	Scenario("uploads_file", "GET", "admin", lambda ctx, rnd: (f"/uploads/{ctx.upload_path}", {})),
+	# api
+	Scenario("api.api_login", "POST", None, lambda ctx, rnd: ("/api/login", {"json": {"email": f"student{rnd.choice(ctx.student_ids)}@synthetic.example", "password": "bench"}})),
+	Scenario("api.api_token_refresh", "POST", None, lambda ctx, rnd: ("/api/token/refresh", {"json": {"refresh_token": rnd.choice(ctx.refresh_tokens)}})),
+	Scenario("api.api_scholarships", "GET", "student", lambda ctx, rnd: ("/api/scholarships", {"query_string": rnd.choice([{}, {"active": "1"}, {"q": "need"}, {"fields": "name,amount"}])})),
+	Scenario("api.api_create_scholarship", "POST", "admin", lambda ctx, rnd: ("/api/scholarships", {"json": {**_new_scholarship(ctx), "amount": 1000}})),
+	Scenario("api.api_apply", "POST", "student", lambda ctx, rnd: ("/api/apply", {"json": {"scholarship_id": rnd.choice(ctx.scholarship_ids), "cgpa": 9.0}})),
+	Scenario("api.api_applications", "GET", "admin", lambda ctx, rnd: ("/api/applications", {"query_string": {"status": rnd.choice(["pending", "approved", "rejected"])}})),
+	Scenario("api.api_approve", "POST", "admin", lambda ctx, rnd: ("/api/approve", {"json": {"application_id": rnd.choice(ctx.pending_ids), "status": "approved"}})),
+	Scenario("api.api_approve_batch", "POST", "admin", lambda ctx, rnd: ("/api/approve/batch", {"json": {
+		"application_ids": rnd.sample(ctx.pending_ids, min(50, len(ctx.pending_ids))), "status": "rejected",
+	}})),
+	Scenario("api.api_export", "GET", "admin", lambda ctx, rnd: ("/api/export/applications", {"query_string": {"format": "ndjson", "status": "approved"}}), max_requests=2),
+	Scenario("api.api_fund_report_year", "GET", "admin", lambda ctx, rnd: ("/api/fund-report/year", {"query_string": {"year": ctx.year}})),
+]
+
+
+def build_dataset(applications: int, seed: int) -> None:
+	# A quarter as many students as applications; runs inside an app context
+	from app import synthetic
+	synthetic.generate(
+		students=max(100, applications // 4), scholarships=max(50, applications // 500), applications=applications,
+		seed=seed, password="bench", log=lambda msg: print(f"  {msg}"),
+	)
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+	if not sorted_values:
+		return 0.0
+	k = (len(sorted_values) - 1) * pct / 100
+	lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+	return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _login(client, user_id: int) -> None:
+	# Straight into the session: what's measured is the route, not the login in front of it
+	with client.session_transaction() as sess:
+		sess["_user_id"] = str(user_id)
+		sess["_fresh"] = True
+
+
+def run_scenario(app, scenario: Scenario, ctx: Context, admin_id: int, requests: int, concurrency: int, query_counter) -> dict:
+	total = min(requests, scenario.max_requests or requests)
+	latencies, queries, errors = [], [], []
+	remaining = [total]
+	lock = threading.Lock()
+
+	def worker(seed: int):
+		rnd = random.Random(seed)
+		client = app.test_client()
+		while True:
+			with lock:
+				if remaining[0] <= 0:
+					return
+				remaining[0] -= 1
+			if scenario.role == "admin":
+				_login(client, admin_id)
+			elif scenario.role == "student":
+				_login(client, rnd.choice(ctx.student_ids))
+			path, kwargs = scenario.build(ctx, rnd)
+			query_counter.count = 0
+			started = time.perf_counter()
+			try:
+				rv = client.open(path, method=scenario.method, **kwargs)
+				rv.get_data()
+				status = rv.status_code
+			except Exception as exc:  # a crash is a result too
+				status = repr(exc)
+			elapsed = time.perf_counter() - started
+			with lock:
+				latencies.append(elapsed * 1000)
+				queries.append(query_counter.count)
+				if not isinstance(status, int) or status >= 500:
+					errors.append(status)
+
+	threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+	started = time.perf_counter()
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	wall = time.perf_counter() - started
+	latencies.sort()
+	return {
+		"method": scenario.method,
+		"requests": len(latencies),
+		"errors": len(errors),
+		"error_samples": [str(e) for e in errors[:3]],
+		"p50_ms": round(_percentile(latencies, 50), 2),
+		"p95_ms": round(_percentile(latencies, 95), 2),
+		"p99_ms": round(_percentile(latencies, 99), 2),
+		"mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0,
+		"max_ms": round(latencies[-1], 2) if latencies else 0,
+		"throughput_rps": round(len(latencies) / wall, 1) if wall else 0,
+		"queries_mean": round(statistics.fmean(queries), 1) if queries else 0,
+		"queries_max": max(queries) if queries else 0,
+	}
+
+
+def prepare_context(app, rnd: random.Random, disposable: int) -> tuple[Context, int]:
+	from app import db
+	from app.models import User, Scholarship, Application
+	from app.storage import save_uploaded
+	from app.tokens import issue_tokens
+	from werkzeug.datastructures import FileStorage
+	with app.test_request_context():
+		admin_id = db.session.query(User.user_id).filter(User.role == "admin").order_by(User.user_id).first()[0]
+		student_ids = [r[0] for r in db.session.query(User.user_id).filter(User.role == "student").limit(5000)]
+		scholarship_ids = [r[0] for r in db.session.query(Scholarship.scholarship_id)]
+		pending_ids = [r[0] for r in db.session.query(Application.application_id).filter(Application.status == "pending").limit(20_000)]
+		application_ids = [r[0] for r in db.session.query(Application.application_id).limit(20_000)]
+		upload_path = save_uploaded(FileStorage(io.BytesIO(PDF_BYTES), filename="bench.pdf"))
+		refresh_tokens = [issue_tokens(u)["refresh_token"] for u in db.session.query(User).filter(User.user_id.in_(student_ids[:50]))]
+		today = date.today()
+		created = []
+		for i in range(disposable):
+			sch = Scholarship(name=f"Disposable {i}", category="bench", eligibility="Deleted by the benchmark", amount=1,
+				start_date=today, end_date=today)
+			db.session.add(sch)
+			created.append(sch)
+		db.session.commit()
+		ctx = Context(
+			student_ids=student_ids,
+			scholarship_ids=scholarship_ids,
+			application_ids=application_ids,
+			pending_ids=pending_ids,
+			year=today.year,
+			upload_path=upload_path,
+			refresh_tokens=refresh_tokens,
+			disposable_scholarships=[s.scholarship_id for s in created],
+		)
+	rnd.shuffle(ctx.student_ids)
+	return ctx, admin_id
+
+
+def compare(current: dict, previous_path: str) -> None:
+	with open(previous_path) as fh:
+		previous = json.load(fh)
+	print(f"\n{'route':<40} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+	for name, now in sorted(current["routes"].items()):
+		before = previous.get("routes", {}).get(name)
+		if not before:
+			continue
+		change = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0
+		print(f"{name:<40} {before['p95_ms']:>11.1f} {now['p95_ms']:>9.1f} {change:>+7.0f}%")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark every route against a synthetic database.")
+	parser.add_argument("--scale", choices=sorted(SCALES), default="10k", help="Number of applications in the synthetic database.")
+	parser.add_argument("--db", help="SQLite file to use (default instance/bench-<scale>.db, built if missing).")
+	parser.add_argument("--rebuild", action="store_true", help="Rebuild the synthetic database even if it exists.")
+	parser.add_argument("--requests", type=int, default=50, help="Requests per route.")
+	parser.add_argument("--concurrency", type=int, default=8, help="Simulated users (threads) per route.")
+	parser.add_argument("--routes", default="", help="Only endpoints containing this text.")
+	parser.add_argument("--output", help="JSON results file (default instance/benchmarks/<scale>-<timestamp>.json).")
+	parser.add_argument("--compare", help="Earlier results file to compare p95 latency against.")
+	parser.add_argument("--seed", type=int, default=1)
+	args = parser.parse_args()
+
+	db_path = Path(args.db or BASE_DIR / "instance" / f"bench-{args.scale}.db").resolve()
+	if args.rebuild and db_path.exists():
+		db_path.unlink()
+	fresh = not db_path.exists()
+	os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+	os.environ.setdefault("BCRYPT_ROUNDS", "4")  # the shared synthetic hash; avoids rehash-on-login
+	upload_dir = db_path.parent / f"{db_path.stem}-uploads"
+
+	from app import create_app, db
+	from sqlalchemy import event
+	app = create_app()
+	app.config.update(UPLOAD_FOLDER=str(upload_dir), LOGIN_MAX_FAILURES_PER_IP=10**9)
+	upload_dir.mkdir(parents=True, exist_ok=True)
+	rnd = random.Random(args.seed)
+
+	with app.app_context():
+		if fresh:
+			db.create_all()
+			started = time.perf_counter()
+			print(f"Building {db_path.name} with {SCALES[args.scale]:,} applications...")
+			build_dataset(SCALES[args.scale], args.seed)
+			print(f"  built in {time.perf_counter() - started:.0f}s")
+		query_counter = threading.local()
+		for engine in db.engines.values():
+			event.listen(engine, "before_cursor_execute", lambda *a, **k: setattr(query_counter, "count", getattr(query_counter, "count", 0) + 1))
+
+	scenarios = [s for s in SCENARIOS if args.routes in s.endpoint]
+	covered = {s.endpoint for s in SCENARIOS}
+	uncovered = sorted({r.endpoint for r in app.url_map.iter_rules()} - covered)
+	if uncovered:
+		print(f"Routes without a scenario: {', '.join(uncovered)}")
+
+	ctx, admin_id = prepare_context(app, rnd, disposable=args.requests)
+	results = {}
+	for scenario in scenarios:
+		results[scenario.endpoint] = run_scenario(app, scenario, ctx, admin_id, args.requests, args.concurrency, query_counter)
+		r = results[scenario.endpoint]
+		print(
+			f"{scenario.endpoint:<40} p50 {r['p50_ms']:>8.1f}ms  p95 {r['p95_ms']:>8.1f}ms  p99 {r['p99_ms']:>8.1f}ms  "
+			f"{r['throughput_rps']:>7.1f} req/s  {r['queries_mean']:>5.1f} queries" + (f"  {r['errors']} errors" if r["errors"] else "")
+		)
+
+	try:
+		commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip()
+	except OSError:
+		commit = ""
+	report = {
+		"meta": {
+			"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+			"commit": commit,
+			"scale": args.scale,
+			"applications": SCALES[args.scale],
+			"requests_per_route": args.requests,
+			"concurrency": args.concurrency,
+			"python": platform.python_version(),
+			"database": db_path.name,
+			"uncovered_routes": uncovered,
+		},
+		"routes": results,
+	}
+	out = Path(args.output or BASE_DIR / "instance" / "benchmarks" / f"{args.scale}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.json")
+	out.parent.mkdir(parents=True, exist_ok=True)
+	out.write_text(json.dumps(report, indent=2))
+	print(f"\nResults written to {out}")
+	if args.compare:
+		compare(report, args.compare)
+
+
+if __name__ == "__main__":
+	main()
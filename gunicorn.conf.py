@@ -0,0 +1,31 @@
+# gunicorn -c gunicorn.conf.py run:app (see Procfile). Workers come from WEB_CONCURRENCY, the port from PORT.
+import os
+
+# Threaded workers: a login waiting on the bcrypt pool holds one thread, not the whole process, so the
+# other threads keep serving pages. BCRYPT_POOL_SIZE and BCRYPT_QUEUE_DEPTH (per worker) bound how many of
+# the threads logins can take; the rest are turned away with "busy" instead of queueing.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Build and warm the app once in the master; workers fork with mappers configured and templates compiled
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+	if preload_app:
+		from app import startup
+		server.log.info(startup.summary())
+
+
+def post_fork(server, worker):
+	if preload_app:
+		from run import app
+		from app import startup
+		startup.after_fork(app)
+
+
+def post_worker_init(worker):
+	# Without preload each worker builds its own app, so report its startup instead
+	if not preload_app:
+		from app import startup
+		worker.log.info(startup.summary())
@@ -1,11 +1,12 @@
 import os
-from app import create_app
+import time
+from app import create_app, startup
 
+started = time.perf_counter()
 app = create_app()
+if app.config["WARM_STARTUP"]:
+	startup.warm(app, started)
 
 if __name__ == "__main__":
 	port = int(os.environ.get("PORT", 5000))
 	app.run(host="0.0.0.0", port=port)
-
-
-
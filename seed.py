@@ -1,5 +1,6 @@
 from datetime import date, timedelta
-from app import create_app, db
+import sys
+from app import create_app, db, versions, submissions
 from app.models import User, Scholarship, Finance
 from app.utils import hash_password
 
@@ -7,6 +8,13 @@ app = create_app()
 
 with app.app_context():
 	db.create_all()
+	# create_all() skips indexes on tables that already exist; submissions rely on this one
+	dupes = submissions.ensure_unique_index()
+	if dupes:
+		print("Cannot add the one-application-per-scholarship unique index; resolve these duplicates (student, scholarship, count):", file=sys.stderr)
+		for student_id, scholarship_id, count in dupes:
+			print(f"  {student_id}, {scholarship_id}, {count}", file=sys.stderr)
+		sys.exit(1)
 	if not db.session.query(User).filter_by(email="admin@example.com").first():
 		admin = User(name="Admin", email="admin@example.com", password_hash=hash_password("admin123"), role="admin")
 		db.session.add(admin)
@@ -21,6 +29,7 @@ with app.app_context():
 			Scholarship(name="Merit Excellence", category="merit", eligibility="CGPA >= 8.0", amount=20000, start_date=today, end_date=today + timedelta(days=60), min_cgpa=8.0),
 			Scholarship(name="Need Based Support", category="financial", eligibility="Income <= 3L", amount=30000, start_date=today, end_date=today + timedelta(days=45), income_limit=300000),
 		])
+		versions.bump(versions.SCHOLARSHIPS)
 		print("Seeded scholarships")
 	if not db.session.query(Finance).filter_by(year=date.today().year).first():
 		db.session.add(Finance(year=date.today().year, budget_amount=500000))
@@ -0,0 +1,28 @@
+import argparse
+import os
+import socket
+import time
+from app import create_app, db
+from app.jobs import run_once
+
+app = create_app()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Run queued background jobs.")
+	parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+	args = parser.parse_args()
+	worker_id = f"{socket.gethostname()}:{os.getpid()}"
+	with app.app_context():
+		while True:
+			ran = run_once(worker_id)
+			db.session.remove()
+			if ran:
+				continue
+			if args.once:
+				break
+			time.sleep(app.config["JOB_POLL_SECONDS"])
+
+
+if __name__ == "__main__":
+	main()